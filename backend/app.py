@@ -7,14 +7,23 @@ import os
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
-from .models import ParkingLot, ParkingSpot, Reservation, User
+from sqlalchemy.orm import joinedload
+from .models import ParkingSpot, Reservation, User
 from flask_caching import Cache
-from .cache_utils import cache_manager, CacheKeys, CacheTTL
+from .cache_utils import cache_manager, invalidate_parking_cache
+from .cache_warming import read_family, read_family_page, schedule_warm_all
+from .pagination import PageRequest
+from .queries import RESERVATION_FILTERS, stream_admin_history
+from .routes.api_resources import stream_list
+from .spot_state import rebuild_free_spots, rebuild_lot_counts
+from .booking_expiry import rebuild_deadlines
+from .sqlite_tuning import enable_sqlite_tuning
 
 load_dotenv()
 
 from .models import db
 from .init_admin import create_admin
+from .migrations import upgrade_db
 
 def make_celery(app):
     from celery import Celery
@@ -33,6 +42,31 @@ def make_celery(app):
     celery.Task = ContextTask
     return celery
 
+def database_uri(default):
+    uri = os.getenv('DATABASE_URL', default)
+    # Older Heroku-style URLs use a scheme SQLAlchemy no longer accepts.
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def engine_options(uri):
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    if uri.startswith('sqlite'):
+        return options
+
+    options.update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    })
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000))
+    if uri.startswith('postgresql') and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
 def create_app():
     app = Flask(__name__)
     CORS(app)
@@ -43,7 +77,8 @@ def create_app():
 
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     db_path = os.path.join(BASE_DIR, 'parking_app.db')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(f'sqlite:///{db_path}')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
     try:
@@ -63,14 +98,18 @@ def create_app():
         print("⚠️  Redis not available, using SimpleCache")
 
     app.config['result_backend'] = os.getenv('CELERY_RESULT_BACKEND')
+    app.config['CACHE_KEY_VERSIONING'] = os.getenv('CACHE_KEY_VERSIONING', 'false').lower() == 'true'
+    app.config['CACHE_L1_ENABLED'] = os.getenv('CACHE_L1_ENABLED', 'false').lower() == 'true'
+    app.config['SQLITE_TUNING'] = os.getenv('SQLITE_TUNING', 'false').lower() == 'true'
     cache_manager.init_app(app)
     db.init_app(app)
+    enable_sqlite_tuning(app, db)
     api = Api(app)
 
     from backend.routes.api_resources import (
         LoginResource, RegisterResource, ProfileResource, RefreshTokenResource, LogoutResource,
-        UserFeedbackResource, UserParkingLotsResource, UserParkingLotSpotsResource,
-        UserActiveReservationsResource, UserBookSpotResource, UserOccupySpotResource,
+        UserFeedbackResource, UserParkingLotsResource, UserParkingLotSpotsResource, UserParkingLotSpotMapResource,
+        UserActiveReservationsResource, UserBookSpotResource, UserBookAnySpotResource, UserBatchBookResource, UserOccupySpotResource,
         UserBookingHistoryResource,UserUpdateProfileResource,UserCancelBookingResource,
         UserReleaseSpotResource,UserChangePasswordResource,UserReservationsResource,
         AdminExportUsersResource, AdminSendMonthlyReportsResource,
@@ -93,8 +132,11 @@ def create_app():
     api.add_resource(UserFeedbackResource, '/api/user/feedback')
     api.add_resource(UserParkingLotsResource, '/api/user/parking-lots')
     api.add_resource(UserParkingLotSpotsResource, '/api/user/parking-lots/<int:lot_id>/spots')
+    api.add_resource(UserParkingLotSpotMapResource, '/api/user/parking-lots/<int:lot_id>/spot-map')
     api.add_resource(UserActiveReservationsResource, '/api/user/active-reservations')
     api.add_resource(UserBookSpotResource, '/api/user/book-spot')
+    api.add_resource(UserBookAnySpotResource, '/api/user/parking-lots/<int:lot_id>/book')
+    api.add_resource(UserBatchBookResource, '/api/user/book-batch')
     api.add_resource(UserOccupySpotResource, '/api/user/occupy-spot')
     api.add_resource(UserBookingHistoryResource, '/api/user/booking-history')
     api.add_resource(UserUpdateProfileResource, '/api/user/update-profile')
@@ -221,6 +263,19 @@ def admin_required(f):
     
     return decorated_function
 
+def init_db():
+    # Once per deploy, not in every process that imports the app.
+    db.create_all()
+    upgrade_db()
+    create_admin()
+    rebuild_lot_counts()
+    rebuild_free_spots()
+    rebuild_deadlines()
+
+@app.cli.command('init-db')
+def init_db_command():
+    init_db()
+
 with app.app_context():
     db.create_all()
     create_admin()
@@ -258,14 +313,28 @@ def get_cache_stats():
 @admin_required
 def warm_cache():
     try:
-        user_view_parking_lots()
-        get_all_parking_lots()
-        get_all_reservations()
-        return jsonify({'success': True, 'message': 'Cache warmed successfully'})
+        queued = schedule_warm_all()
+        return jsonify({
+            'success': True,
+            'message': f'Cache warming queued for {len(queued)} entries',
+            'queued': sorted(set(queued))
+        }), 202
    
     except Exception as e:
         return jsonify({'success': False, 'message': f'Cache warming failed: {str(e)}'}), 500
 
+@app.route('/api/admin/cache/counters/rebuild', methods=['POST'])
+@admin_required
+def rebuild_counters():
+    try:
+        counts = rebuild_lot_counts()
+        rebuild_free_spots()
+        invalidate_parking_cache()
+        return jsonify({'success': True, 'message': f'Spot counters rebuilt for {len(counts)} lots', 'counts': counts})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Counter rebuild failed: {str(e)}'}), 500
+
 @app.route('/api/admin/cache/clear', methods=['POST'])
 @admin_required
 def clear_cache():
@@ -274,6 +343,7 @@ def clear_cache():
         cache_manager.delete_pattern("parking:*")
         cache_manager.delete_pattern("spot:*")
         cache_manager.delete_pattern("admin:*")
+        cache_manager.delete_pattern("tag:*")
         return jsonify({'success': True, 'message': 'Cache cleared successfully'})
 
     except Exception as e:
@@ -281,31 +351,7 @@ def clear_cache():
 
 @admin_required
 def get_all_parking_lots():
-    cache_key = "admin:parking:lots:all"
-    cached_lots = cache_manager.get(cache_key)
-    if cached_lots:
-        return jsonify({'success': True, 'parking_lots': cached_lots})
-
-    lots = ParkingLot.query.all()
-    data = []
-    for lot in lots:
-        total = len(lot.spots)
-        available = sum(1 for s in lot.spots if s.status == 'A' and not s.is_under_maintenance)
-        occupied = sum(1 for s in lot.spots if s.status == 'O')
-        maintenance = sum(1 for s in lot.spots if s.is_under_maintenance)
-        data.append({
-            'id': lot.id,
-            'name': lot.prime_location_name,
-            'address': lot.address,
-            'price_per_hour': lot.price_per_hour,
-            'pin_code': lot.pin_code,
-            'capacity': total,
-            'available': available,
-            'occupied': occupied,
-            'maintenance': maintenance,
-        })
-
-    cache_manager.set(cache_key, data, CacheTTL.PARKING_AVAILABILITY)
+    data = read_family('admin_parking_lots')
     return jsonify({'success': True, 'parking_lots': data})
 
 def startup_cleanup():
@@ -324,10 +370,10 @@ def get_current_bookings():
     current_user_id = request.current_user_id
     try:
         current_time = datetime.utcnow() + timedelta(hours=5, minutes=30)
-        bookings = Reservation.query.filter(
+        bookings = Reservation.query.options(joinedload(Reservation.lot)).filter(
             Reservation.user_id == current_user_id,
             Reservation.booking_status == 'booked',
-            Reservation.booking_timestamp + timedelta(hours=12) > current_time  
+            Reservation.booking_timestamp > current_time - timedelta(hours=12)
         ).order_by(Reservation.booking_timestamp.desc()).all()
 
         booking_data = []
@@ -337,7 +383,7 @@ def get_current_bookings():
             expires_at = booking.booking_timestamp + timedelta(hours=12)
             booking_data.append({
                 'id': booking.id,
-                'location_name': booking.prime_location_name,
+                'location_name': booking.location_name,
                 'spot_number': spot_number,
                 'vehicle_number': booking.vehicle_number,
                 'booking_timestamp': booking.booking_timestamp.isoformat(),
@@ -357,83 +403,19 @@ def get_current_bookings():
 
 @admin_required
 def get_all_reservations():
-    cache_key = CacheKeys.admin_history()
-    cached_history = cache_manager.get(cache_key)
-    if cached_history:
-        return jsonify({'success': True, 'history': cached_history})
-
-    reservations = Reservation.query.order_by(Reservation.parking_timestamp.desc()).all()
-    history = []
-
-    for r in reservations:
-        duration_hours = None
-        end_time_str = None
-        cost = 0
-        breakdown = {}
-        if r.leaving_timestamp:
-            duration = r.leaving_timestamp - r.parking_timestamp
-            duration_hours = round(duration.total_seconds() / 3600, 2)
-            end_time_str = r.leaving_timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            cost = r.parking_cost or 0
-            lot = ParkingLot.query.filter_by(prime_location_name=r.prime_location_name).first()
-            if lot and cost == 0:
-                base_rate = lot.price_per_hour
-                cost = round(duration_hours * base_rate, 2)
-                breakdown = {
-                    'base_rate': base_rate,
-                    'duration_hours': duration_hours,
-                    'total_cost': cost
-                }
-        user = db.session.get( User, r.user_id)
-        username = user.username if user else 'Unknown User'
-        spot_number = 'N/A'
-        if r.spot_id:
-            spot = db.session.get( ParkingSpot, r.spot_id)
-            if spot:
-                spot_number = spot.spot_number
-
-        booking_time_str = None
-        if r.booking_timestamp:
-            booking_time_str = r.booking_timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-        history.append({
-            'id': r.id,
-            'user_id': r.user_id,
-            'user_name': username,
-            'location': r.prime_location_name,
-            'spot_number': spot_number,
-            'vehicle_number': r.vehicle_number,
-            'booking_timestamp': booking_time_str,
-            'booking_status': r.booking_status,
-            'start_time': r.parking_timestamp.strftime("%Y-%m-%d %H:%M:%S") if r.parking_timestamp else None,
-            'end_time': end_time_str,
-            'cost': cost,
-            'cost_breakdown': breakdown
-        })
-
-    cache_manager.set(cache_key, history, CacheTTL.ADMIN_HISTORY)
-    return jsonify({'success': True, 'history': history})
+    try:
+        page = PageRequest.from_args(request.args, RESERVATION_FILTERS)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if page:
+        result = read_family_page('admin_history', page)
+        return jsonify({'success': True, 'history': result['items'], 'next_cursor': result['next_cursor']})
+
+    return stream_list('history', stream_admin_history())
 
 def user_view_parking_lots():
-    cache_key = CacheKeys.parking_lots_all()
-    cached_lots = cache_manager.get(cache_key)
-    if cached_lots:
-        return jsonify({'lots': cached_lots})
-
-    lots = ParkingLot.query.all()
-    data = []
-    for lot in lots:
-        available_spots = sum(1 for s in lot.spots if s.status == 'A' and not s.is_under_maintenance)
-        data.append({
-            'id': lot.id,
-            'prime_location_name': lot.prime_location_name,
-            'address': lot.address,
-            'pin_code': lot.pin_code,
-            'price_per_hour': lot.price_per_hour,
-            'available_spots': available_spots
-        })
-
-    cache_manager.set(cache_key, data, CacheTTL.PARKING_LOTS_ALL)
+    data = read_family('parking_lots_all')
     return jsonify({'lots': data})
 
 
@@ -0,0 +1,135 @@
+import calendar
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event
+from sqlalchemy.orm import Session
+from .cache_utils import cache_manager, CacheKeys, invalidate_parking_cache, invalidate_user_cache, invalidate_admin_cache
+from .cache_warming import Mutations, schedule_warm
+from .models import db, Reservation
+from .spot_state import release_booked_spots
+
+logger = logging.getLogger(__name__)
+
+# Open bookings' deadlines live in a Redis sorted set, scored in IST like
+# the timestamps, so the sweeper only reads the bookings that are due.
+
+BOOKING_HOLD = timedelta(hours=12)
+SWEEP_BATCH = 500
+PENDING = "booking_deadline_changes"
+
+def deadline_score(booking_timestamp):
+    return calendar.timegm((booking_timestamp + BOOKING_HOLD).timetuple())
+
+def _ist_now():
+    return datetime.utcnow() + timedelta(hours=5, minutes=30)
+
+@event.listens_for(Session, "after_flush")
+def _collect_deadlines(session, flush_context):
+    changes = session.info.setdefault(PENDING, {})
+    for reservation in session.new:
+        if isinstance(reservation, Reservation) and reservation.booking_status == 'booked':
+            changes[reservation.id] = deadline_score(reservation.booking_timestamp)
+
+    for reservation in session.dirty:
+        if isinstance(reservation, Reservation) and reservation.booking_status != 'booked':
+            changes[reservation.id] = None
+
+    for reservation in session.deleted:
+        if isinstance(reservation, Reservation):
+            changes[reservation.id] = None
+
+@event.listens_for(Session, "after_commit")
+def _apply_deadlines(session):
+    changes = session.info.pop(PENDING, None)
+    if not changes or not cache_manager.is_available():
+        return
+    try:
+        pipe = cache_manager.redis_client.pipeline(transaction=False)
+        added = {reservation_id: score for reservation_id, score in changes.items() if score is not None}
+        removed = [reservation_id for reservation_id, score in changes.items() if score is None]
+        if added:
+            pipe.zadd(CacheKeys.booking_deadlines(), added)
+        if removed:
+            pipe.zrem(CacheKeys.booking_deadlines(), *removed)
+        cache_manager._execute(pipe.execute)
+
+    except Exception as e:
+        # The hourly safety net rebuilds the index from the DB.
+        logger.error(f"Booking deadline update failed: {e}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_deadlines(session):
+    session.info.pop(PENDING, None)
+
+def rebuild_deadlines():
+    bookings = db.session.query(Reservation.id, Reservation.booking_timestamp).filter(
+        Reservation.booking_status == 'booked').all()
+    if not cache_manager.is_available():
+        return len(bookings)
+
+    try:
+        pipe = cache_manager.redis_client.pipeline(transaction=True)
+        pipe.delete(CacheKeys.booking_deadlines())
+        for start in range(0, len(bookings), 1000):
+            pipe.zadd(CacheKeys.booking_deadlines(), {
+                reservation_id: deadline_score(booking_timestamp)
+                for reservation_id, booking_timestamp in bookings[start:start + 1000]
+                if booking_timestamp
+            })
+        cache_manager._execute(pipe.execute)
+
+    except Exception as e:
+        logger.error(f"Booking deadline rebuild failed: {e}")
+    return len(bookings)
+
+def _due_ids(now, limit, from_db):
+    if not from_db and cache_manager.is_available():
+        try:
+            due = cache_manager._execute(cache_manager.redis_client.zrangebyscore, CacheKeys.booking_deadlines(),
+                                         '-inf', calendar.timegm(now.timetuple()), start=0, num=limit)
+            return [int(reservation_id) for reservation_id in due]
+        except Exception as e:
+            logger.error(f"Booking deadline read failed: {e}")
+
+    return [row.id for row in db.session.query(Reservation.id).filter(
+        Reservation.booking_status == 'booked',
+        Reservation.leaving_timestamp.is_(None),
+        Reservation.booking_timestamp <= now - BOOKING_HOLD
+    ).order_by(Reservation.booking_timestamp).limit(limit)]
+
+def expire_due(now=None, limit=SWEEP_BATCH, from_db=False):
+    # Returns the number of bookings expired.
+    now = now or _ist_now()
+    due = _due_ids(now, limit, from_db)
+    if not due:
+        return 0
+
+    # The WHERE clause re-checks every id, so an index entry for a booking
+    # that was occupied or cancelled in the meantime is simply dropped.
+    expired = db.session.execute(
+        delete(Reservation).where(
+            Reservation.id.in_(due),
+            Reservation.booking_status == 'booked',
+            Reservation.leaving_timestamp.is_(None),
+            Reservation.booking_timestamp <= now - BOOKING_HOLD
+        ).returning(Reservation.id, Reservation.spot_id, Reservation.user_id)
+        .execution_options(synchronize_session=False)).all()
+    lot_ids = release_booked_spots([row.spot_id for row in expired])
+    db.session.commit()
+
+    if cache_manager.is_available():
+        try:
+            cache_manager._execute(cache_manager.redis_client.zrem, CacheKeys.booking_deadlines(), *due)
+        except Exception as e:
+            logger.error(f"Booking deadline cleanup failed: {e}")
+
+    if expired:
+        for lot_id in lot_ids:
+            invalidate_parking_cache(lot_id)
+        invalidate_parking_cache()
+        for user_id in {row.user_id for row in expired}:
+            invalidate_user_cache(user_id)
+        invalidate_admin_cache()
+        for lot_id in lot_ids:
+            schedule_warm(Mutations.EXPIRE, lot_id)
+    return len(expired)
@@ -1,87 +1,624 @@
+import hashlib
 import json
 import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, defaultdict
 from datetime import datetime
 from functools import wraps
 from typing import List
 import redis
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4
+except ImportError:
+    lz4 = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Deletes the members of each tag set, then the set; returns the deleted keys.
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+for _, tag_key in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag_key)
+    for i = 1, #members, 500 do
+        redis.call('DEL', unpack(members, i, math.min(i + 499, #members)))
+    end
+    for _, member in ipairs(members) do
+        table.insert(deleted, member)
+    end
+    redis.call('DEL', tag_key)
+end
+return deleted
+"""
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Releases a recompute lock only if we still own it.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class CacheCodec:
+    # MAGIC | codec | compression | payload; values without it are plain JSON.
+
+    MAGIC = b"\x01"
+    CODECS = {"json": b"j", "orjson": b"o", "msgpack": b"m"}
+    COMPRESSIONS = {None: b"n", "zlib": b"z", "lz4": b"l"}
+
+    @staticmethod
+    def available(codec=None, compression=None):
+        if codec == "orjson" and orjson is None:
+            return False
+        if codec == "msgpack" and msgpack is None:
+            return False
+        if compression == "lz4" and lz4 is None:
+            return False
+        return True
+
+    @staticmethod
+    def encode(value, codec="json", compression=None, threshold=0):
+        if not CacheCodec.available(codec=codec):
+            codec = "json"
+        if not CacheCodec.available(compression=compression):
+            compression = "zlib"
+
+        if codec == "orjson":
+            payload = orjson.dumps(value, default=str,
+                                   option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        elif codec == "msgpack":
+            payload = msgpack.packb(CacheCodec._str_keys(value), default=str, use_bin_type=True)
+        else:
+            payload = json.dumps(value, default=str).encode("utf-8")
+
+        if compression is None or len(payload) < threshold:
+            compression = None
+        elif compression == "lz4":
+            payload = lz4.compress(payload)
+        else:
+            payload = zlib.compress(payload, 6)
+
+        return CacheCodec.MAGIC + CacheCodec.CODECS[codec] + CacheCodec.COMPRESSIONS[compression] + payload
+
+    @staticmethod
+    def _str_keys(value):
+        # Keys come back as strings under JSON; msgpack has to match.
+        if isinstance(value, dict):
+            return {key if isinstance(key, str) else json.dumps(key): CacheCodec._str_keys(item)
+                    for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [CacheCodec._str_keys(item) for item in value]
+        return value
+
+    @staticmethod
+    def decode(raw):
+        if not raw.startswith(CacheCodec.MAGIC):
+            return json.loads(raw)
+
+        codec, compression, payload = raw[1:2], raw[2:3], raw[3:]
+        if compression == b"z":
+            payload = zlib.decompress(payload)
+        elif compression == b"l":
+            payload = lz4.decompress(payload)
+
+        if codec == b"o":
+            return orjson.loads(payload)
+        if codec == b"m":
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        return json.loads(payload)
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=2.0, max_reset_timeout=60.0, name="Redis"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.current_timeout = reset_timeout
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.current_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self.probe_started_at = now
+                return True
+
+            # Half-open: one probe at a time, unless the last never reported back.
+            if now - self.probe_started_at >= self.current_timeout:
+                self.probe_started_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.info(f" {self.name} circuit breaker closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.current_timeout = self.reset_timeout
+            self.probe_started_at = None
+
+    def record_failure(self):
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                # Failed probe: back off exponentially before the next one.
+                self.current_timeout = min(self.current_timeout * 2, self.max_reset_timeout)
+                self._open()
+                return
+
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self):
+        with self.lock:
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_started_at = None
+        self.trips += 1
+        logger.warning(f" {self.name} circuit breaker opened (retry in {self.current_timeout}s)")
+
+    def snapshot(self):
+        with self.lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.current_timeout - (time.monotonic() - self.opened_at)), 2)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "reset_timeout": self.current_timeout,
+                "retry_in": retry_in
+            }
+
+class LocalCache:
+    # Values are shared between requests: treat them as read-only.
+
+    def __init__(self, max_entries=1024, ttl=5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.epoch = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, epoch=None):
+        with self.lock:
+            # An eviction since the Redis read wins over the value read.
+            if epoch is not None and epoch != self.epoch:
+                return
+            self.entries[key] = (time.monotonic() + min(ttl, self.ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def evict(self, keys):
+        with self.lock:
+            self.epoch += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class CacheMetrics:
+    # Counted in-process, flushed to Redis so all workers add up.
+
+    FLUSH_INTERVAL = 5
+    FIELDS = ("hits", "misses", "stale_hits", "sets", "invalidations",
+              "bytes_read", "bytes_written", "recomputes", "recompute_ms")
+
+    def __init__(self):
+        self.pending = defaultdict(lambda: defaultdict(float))
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, family, **fields):
+        with self.lock:
+            counters = self.pending[family]
+            for name, amount in fields.items():
+                counters[name] += amount
+
+    def due(self):
+        return time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(lambda: defaultdict(float))
+            self.last_flush = time.monotonic()
+        return pending
+
+    @staticmethod
+    def summarize(counters):
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        recomputes = counters.get("recomputes", 0)
+        summary = {name: int(counters.get(name, 0)) for name in CacheMetrics.FIELDS if name != "recompute_ms"}
+        summary["hit_ratio"] = round(counters.get("hits", 0) / lookups, 4) if lookups else None
+        summary["avg_recompute_ms"] = round(counters.get("recompute_ms", 0) / recomputes, 2) if recomputes else None
+        return summary
+
 class CacheManager:
     def __init__(self, app=None):
         self.redis_client = None
+        self.connection_pool = None
+        self.invalidate_script = None
+        self.release_lock_script = None
+        self.versioning = False
+        self.breaker = CircuitBreaker()
+        self.local = None
+        self.subscriber = None
+        self.subscriber_pid = None
+        self.counters = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        self.counters_lock = threading.Lock()
+        self.metrics = CacheMetrics()
         self.app = app
         if app:
             self.init_app(app)
     
     def init_app(self, app):
         self.app = app
+        self.versioning = app.config.get('CACHE_KEY_VERSIONING', False)
+        self.breaker = CircuitBreaker(
+            failure_threshold=app.config.get('CACHE_BREAKER_FAILURE_THRESHOLD', 3),
+            reset_timeout=app.config.get('CACHE_BREAKER_RESET_TIMEOUT', 2.0),
+            max_reset_timeout=app.config.get('CACHE_BREAKER_MAX_RESET_TIMEOUT', 60.0)
+        )
+        if app.config.get('CACHE_L1_ENABLED', False):
+            self.local = LocalCache(
+                max_entries=app.config.get('CACHE_L1_MAX_ENTRIES', 1024),
+                ttl=app.config.get('CACHE_L1_TTL', 5)
+            )
         try:
-            self.redis_client = redis.Redis(
+            self.connection_pool = redis.ConnectionPool(
                 host=app.config.get('CACHE_REDIS_HOST', 'localhost'),
                 port=app.config.get('CACHE_REDIS_PORT', 6379),
                 db=app.config.get('CACHE_REDIS_DB', 0),
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True
+                max_connections=app.config.get('CACHE_REDIS_MAX_CONNECTIONS', 50),
+                socket_connect_timeout=app.config.get('CACHE_REDIS_CONNECT_TIMEOUT', 0.5),
+                socket_timeout=app.config.get('CACHE_REDIS_SOCKET_TIMEOUT', 0.5),
+                health_check_interval=30,
+                decode_responses=False
             )
-            self.redis_client.ping()
+            self.redis_client = redis.Redis(connection_pool=self.connection_pool)
+            self.invalidate_script = self.redis_client.register_script(INVALIDATE_TAGS_SCRIPT)
+            self.release_lock_script = self.redis_client.register_script(RELEASE_LOCK_SCRIPT)
+            self._execute(self.redis_client.ping)
             logger.info(" Redis cache connection established")
 
         except Exception as e:
+            # Keep the client: the breaker retries it, so no restart is needed.
             logger.error(f" Redis connection failed: {e}")
-            self.redis_client = None
+            self.breaker.trip()
     
     def is_available(self):
         if not self.redis_client:
             return False
+        return self.breaker.allow()
+
+    def _execute(self, command, *args, **kwargs):
         try:
-            self.redis_client.ping()
-            return True
-        except:
-            return False
+            result = command(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
     
+    def _count(self, name):
+        with self.counters_lock:
+            self.counters[name] += 1
+
+    def _record(self, key, **fields):
+        self.metrics.record(CacheKeys.family(key), **fields)
+        if self.metrics.due():
+            self.flush_metrics()
+
+    def flush_metrics(self):
+        pending = self.metrics.drain()
+        if not pending or not self.is_available():
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for family, counters in pending.items():
+                pipe.sadd(CacheKeys.metrics_index(), family)
+                for name, amount in counters.items():
+                    if name == "recompute_ms":
+                        pipe.hincrbyfloat(CacheKeys.metrics(family), name, amount)
+                    else:
+                        pipe.hincrby(CacheKeys.metrics(family), name, int(amount))
+            self._execute(pipe.execute)
+        except Exception as e:
+            logger.error(f"Cache metrics flush error: {e}")
+
+    def family_stats(self):
+        self.flush_metrics()
+        if not self.is_available():
+            return {}
+        try:
+            families = sorted(f.decode() for f in self._execute(self.redis_client.smembers, CacheKeys.metrics_index()))
+            pipe = self.redis_client.pipeline(transaction=False)
+            for family in families:
+                pipe.hgetall(CacheKeys.metrics(family))
+            results = self._execute(pipe.execute)
+        except Exception as e:
+            logger.error(f"Cache metrics read error: {e}")
+            return {}
+        return {
+            family: CacheMetrics.summarize({k.decode(): float(v) for k, v in raw.items()})
+            for family, raw in zip(families, results)
+        }
+
+    def _ensure_subscriber(self):
+        # Per process: threads don't survive a worker fork.
+        if self.subscriber_pid == os.getpid():
+            return
+        self.subscriber_pid = os.getpid()
+        try:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+            self.subscriber = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=self._on_subscriber_error)
+        except Exception as e:
+            logger.error(f"Cache invalidation subscriber failed to start: {e}")
+            self.local.clear()
+            self.subscriber_pid = None
+
+    def _on_invalidation(self, message):
+        try:
+            payload = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        if payload.get("flush"):
+            self.local.clear()
+        else:
+            self.local.evict(payload.get("keys", ()))
+
+    def _on_subscriber_error(self, error, pubsub, thread):
+        # Invalidations may have been missed, so L1 can't be trusted.
+        logger.error(f"Cache invalidation subscriber error: {error}")
+        self.local.clear()
+        time.sleep(1)
+
+    def _publish_invalidation(self, keys=(), flush=False):
+        if self.local is None:
+            return
+        if flush:
+            self.local.clear()
+        else:
+            self.local.evict(keys)
+        try:
+            payload = json.dumps({"keys": list(keys), "flush": flush})
+            self._execute(self.redis_client.publish, INVALIDATION_CHANNEL, payload)
+        except Exception as e:
+            logger.error(f"Cache invalidation publish error: {e}")
+
     def get(self, key):
         if not self.is_available():
             logger.debug(f"Cache miss (Redis unavailable): {key}")
             return None
         
+        epoch = None
+        if self.local is not None:
+            self._ensure_subscriber()
+            value = self.local.get(key)
+            if value is not None:
+                self._count("l1_hits")
+                self._record(key, hits=1)
+                logger.debug(f"Cache hit (L1): {key}")
+                return value
+            self._count("l1_misses")
+            epoch = self.local.epoch
+        
         try:
-            value = self.redis_client.get(key)
+            value = self._execute(self.redis_client.get, key)
             if value is None:
+                self._count("l2_misses")
+                self._record(key, misses=1)
                 logger.debug(f"Cache miss: {key}")
                 return None
             
+            self._count("l2_hits")
+            self._record(key, hits=1, bytes_read=len(value))
             logger.debug(f"Cache hit: {key}")
-            return json.loads(value)
+            value = CacheCodec.decode(value)
+            if self.local is not None:
+                self.local.set(key, value, self.local.ttl, epoch=epoch)
+            return value
         
         except Exception as e:
             logger.error(f"Cache get error for {key}: {e}")
             return None
     
-    def set(self,key,value,ttl=300):
+    def set(self,key,value,ttl=300,tags=None):
         if not self.is_available():
             logger.debug(f"Cache set skipped (Redis unavailable): {key}")
             return False
         
         try:
-            serialized_value = json.dumps(value, default=str)
-            result = self.redis_client.setex(key, ttl, serialized_value)
-            logger.debug(f"Cache set: {key} (TTL: {ttl}s)")
+            codec, compression = CacheCodecs.for_key(key)
+            serialized_value = CacheCodec.encode(value, codec, compression, CacheCodecs.COMPRESS_THRESHOLD)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, ttl, serialized_value)
+            if self.versioning:
+                # Versioned namespaces are dropped by a generation bump, not tags.
+                tags = [tag for tag in tags or () if not CacheTags.is_versioned(tag)]
+            for tag in tags or ():
+                tag_key = CacheTags.key(tag)
+                pipe.sadd(tag_key, key)
+                pipe.expire(tag_key, CacheTTL.TAG_INDEX)
+            result = self._execute(pipe.execute)[0]
+            self._record(key, sets=1, bytes_written=len(serialized_value))
+            logger.debug(f"Cache set: {key} (TTL: {ttl}s, tags: {tags or []})")
             return result
         
         except Exception as e:
             logger.error(f"Cache set error for {key}: {e}")
             return False
     
+    def invalidate_tags(self, *tags):
+        if not tags or not self.is_available():
+            return 0
+        
+        try:
+            deleted = [key.decode() for key in
+                       self._execute(self.invalidate_script, keys=[CacheTags.key(tag) for tag in tags])]
+            self._publish_invalidation(keys=deleted)
+            for deleted_key in deleted:
+                self._record(deleted_key, invalidations=1)
+            logger.debug(f"Cache invalidate tags: {list(tags)} ({len(deleted)} keys)")
+            return len(deleted)
+        
+        except Exception as e:
+            logger.error(f"Cache invalidate tags error for {list(tags)}: {e}")
+            return 0
+    
+    def acquire_lock(self, key, timeout=5):
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._execute(self.redis_client.set, CacheKeys.lock(key), token, nx=True, px=int(timeout * 1000))
+            return token if acquired else None
+        
+        except Exception as e:
+            logger.error(f"Cache lock error for {key}: {e}")
+            return None
+    
+    def release_lock(self, key, token):
+        try:
+            self._execute(self.release_lock_script, keys=[CacheKeys.lock(key)], args=[token])
+        
+        except Exception as e:
+            logger.error(f"Cache unlock error for {key}: {e}")
+    
+    def get_or_compute(self, key, builder, ttl=300, tags=None, stale_ttl=None, beta=1.0,
+                       lock_timeout=5, wait_timeout=2.0, poll_interval=0.05):
+        # One caller recomputes, the rest get the stale copy or wait for it.
+        if not self.is_available():
+            return builder()
+
+        stale_ttl = CacheTTL.STALE_GRACE if stale_ttl is None else stale_ttl
+        envelope = self.get(key)
+        stale = None
+        if envelope is not None:
+            if not self._is_envelope(envelope):
+                return envelope
+            stale = envelope["v"]
+            remaining = envelope["exp"] - time.time()
+            early = beta > 0 and envelope["d"] * beta * -math.log(random.random() or 1e-12) >= remaining
+            if remaining > 0 and not early:
+                return stale
+
+        token = self.acquire_lock(key, lock_timeout)
+        if token is None:
+            if stale is not None:
+                self._record(key, stale_hits=1)
+                return stale
+            deadline = time.monotonic() + wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(poll_interval)
+                envelope = self.get(key)
+                if envelope is not None:
+                    return envelope["v"] if self._is_envelope(envelope) else envelope
+            logger.debug(f"Cache single-flight wait timed out: {key}")
+            return builder()
+
+        try:
+            return self._compute_and_store(key, builder, ttl, tags, stale_ttl)
+        finally:
+            self.release_lock(key, token)
+    
+    def refresh(self, key, builder, ttl=300, tags=None, stale_ttl=None, lock_timeout=30):
+        if not self.is_available():
+            return False
+
+        token = self.acquire_lock(key, lock_timeout)
+        if token is None:
+            return False
+        try:
+            value = self._compute_and_store(key, builder, ttl, tags,
+                                            CacheTTL.STALE_GRACE if stale_ttl is None else stale_ttl)
+            # A rewritten value must not keep serving the old ETag.
+            if value is not None and tags:
+                self.bump_state(*tags)
+            return True
+        finally:
+            self.release_lock(key, token)
+    
+    def _compute_and_store(self, key, builder, ttl, tags, stale_ttl):
+        started = time.monotonic()
+        value = builder()
+        delta = time.monotonic() - started
+        self._record(key, recomputes=1, recompute_ms=delta * 1000)
+        if value is not None:
+            envelope = {"__cached__": 1, "v": value, "exp": time.time() + ttl, "d": round(delta, 4)}
+            self.set(key, envelope, ttl + stale_ttl, tags=tags)
+        return value
+    
+    @staticmethod
+    def _is_envelope(value):
+        return isinstance(value, dict) and value.get("__cached__") == 1
+    
     def delete(self,key):
         if not self.is_available():
             return False
         
         try:
-            result = self.redis_client.delete(key)
+            result = self._execute(self.redis_client.delete, key)
+            self._publish_invalidation(keys=[key])
+            if result:
+                self._record(key, invalidations=1)
             logger.debug(f"Cache delete: {key}")
             return bool(result)
         
@@ -89,17 +626,96 @@ class CacheManager:
             logger.error(f"Cache delete error for {key}: {e}")
             return False
     
+    def generations(self, *namespaces):
+        if not self.is_available():
+            return [0] * len(namespaces)
+        
+        try:
+            values = self._execute(self.redis_client.mget, [CacheKeys.generation(ns) for ns in namespaces])
+            return [int(value or 0) for value in values]
+        
+        except Exception as e:
+            logger.error(f"Cache generation read error for {list(namespaces)}: {e}")
+            return [0] * len(namespaces)
+    
+    def bump_generation(self, *namespaces):
+        if not namespaces or not self.is_available():
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for namespace in namespaces:
+                pipe.incr(CacheKeys.generation(namespace))
+            self._execute(pipe.execute)
+            for namespace in namespaces:
+                self.metrics.record(f"gen:{namespace.split(':')[0]}", invalidations=1)
+            logger.debug(f"Cache generation bump: {list(namespaces)}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Cache generation bump error for {list(namespaces)}: {e}")
+            return False
+    
+    def state_versions(self, *scopes):
+        # A flush restarts the counters, so a new epoch voids older ETags.
+        if not self.is_available():
+            return None
+        
+        try:
+            values = self._execute(self.redis_client.mget,
+                                   [CacheKeys.state_epoch()] + [CacheKeys.state(scope) for scope in scopes])
+            if values[0] is None:
+                self._execute(self.redis_client.set, CacheKeys.state_epoch(), uuid.uuid4().hex, nx=True)
+                return None
+            return [values[0].decode()] + [int(value or 0) for value in values[1:]]
+        
+        except Exception as e:
+            logger.error(f"Cache state read error for {list(scopes)}: {e}")
+            return None
+    
+    def bump_state(self, *scopes):
+        if not scopes or not self.is_available():
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for scope in scopes:
+                pipe.incr(CacheKeys.state(scope))
+            self._execute(pipe.execute)
+            return True
+        
+        except Exception as e:
+            logger.error(f"Cache state bump error for {list(scopes)}: {e}")
+            return False
+    
+    def state_etag(self, scopes, max_age=None):
+        # None means no ETag may be sent.
+        versions = self.state_versions(*scopes)
+        if versions is None:
+            return None
+        
+        parts = [versions[0]] + [f"{scope}={version}" for scope, version in zip(scopes, versions[1:])]
+        if max_age:
+            parts.append(str(int(time.time() // max_age)))
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:24]
+    
     def delete_pattern(self, pattern):
+        # SCAN, not KEYS, so a flush never blocks Redis.
         if not self.is_available():
             return 0
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                result = self.redis_client.delete(*keys)
-                logger.debug(f"Cache delete pattern: {pattern} ({len(keys)} keys)")
-                return result
-            return 0
+            deleted = 0
+            cursor = 0
+            while True:
+                cursor, keys = self._execute(self.redis_client.scan, cursor=cursor, match=pattern, count=500)
+                if keys:
+                    deleted += self._execute(self.redis_client.delete, *keys)
+                if cursor == 0:
+                    break
+            self._publish_invalidation(flush=True)
+            logger.debug(f"Cache delete pattern: {pattern} ({deleted} keys)")
+            return deleted
         
         except Exception as e:
             logger.error(f"Cache delete pattern error for {pattern}: {e}")
@@ -110,34 +726,93 @@ class CacheManager:
             return False
         
         try:
-            return bool(self.redis_client.exists(key))
+            return bool(self._execute(self.redis_client.exists, key))
         
         except Exception as e:
             logger.error(f"Cache exists error for {key}: {e}")
             return False
     
     def get_stats(self):
+        with self.counters_lock:
+            counters = dict(self.counters)
+        l1_lookups = counters["l1_hits"] + counters["l1_misses"]
+        l2_lookups = counters["l2_hits"] + counters["l2_misses"]
+        stats = {
+            "breaker": self.breaker.snapshot(),
+            "pool_max_connections": self.connection_pool.max_connections if self.connection_pool else 0,
+            "l1_enabled": self.local is not None,
+            "l1_entries": len(self.local) if self.local else 0,
+            "l1_hit_ratio": round(counters["l1_hits"] / l1_lookups, 4) if l1_lookups else None,
+            "l2_hit_ratio": round(counters["l2_hits"] / l2_lookups, 4) if l2_lookups else None,
+            **counters
+        }
         if not self.is_available():
-            return {"status": "unavailable"}
+            stats["status"] = "unavailable"
+            return stats
         
         try:
-            info = self.redis_client.info()
-            return {
+            info = self._execute(self.redis_client.info)
+            stats.update({
                 "status": "available",
+                "families": self.family_stats(),
                 "connected_clients": info.get("connected_clients", 0),
                 "used_memory": info.get("used_memory_human", "0B"),
                 "keyspace_hits": info.get("keyspace_hits", 0),
                 "keyspace_misses": info.get("keyspace_misses", 0),
                 "total_commands_processed": info.get("total_commands_processed", 0)
-            }
+            })
+            return stats
         
         except Exception as e:
             logger.error(f"Cache stats error: {e}")
-            return {"status": "error", "error": str(e)}
+            stats.update({"status": "error", "error": str(e)})
+            return stats
 
 cache_manager = CacheManager()
 
 class CacheKeys:
+    @staticmethod
+    def generation(namespace):
+        return f"gen:{namespace}"
+    
+    @staticmethod
+    def lock(key):
+        return f"lock:{key}"
+    
+    @staticmethod
+    def state(scope):
+        return f"state:{scope}"
+    
+    @staticmethod
+    def state_epoch():
+        return "state:epoch"
+    
+    @staticmethod
+    def metrics(family):
+        return f"cache:stats:{family}"
+    
+    @staticmethod
+    def metrics_index():
+        return "cache:stats:families"
+    
+    @staticmethod
+    def family(key):
+        # user:profile:42 -> user:profile
+        parts = []
+        for part in key.split(":"):
+            if not part or part[0].isdigit() or part == "all" or (part[0] == "g" and part[1:2].isdigit()):
+                break
+            parts.append(part)
+        return ":".join(parts) or key
+    
+    @staticmethod
+    def versioned(key, *namespaces):
+        # Old generations are never deleted, they age out by TTL.
+        if not cache_manager.versioning:
+            return key
+        generations = cache_manager.generations(*namespaces)
+        return f"{key}:g{'.'.join(str(g) for g in generations)}"
+    
     @staticmethod
     def user_profile(user_id):
         return f"user:profile:{user_id}"
@@ -154,51 +829,165 @@ class CacheKeys:
     def user_active(user_id):
         return f"user:active:{user_id}"
     
+    @staticmethod
+    def user_active_reservations(user_id):
+        return f"user:active_reservations:{user_id}"
+    
+    @staticmethod
+    def user_history(user_id):
+        return f"user:history:{user_id}"
+    
+    @staticmethod
+    def user_feedback(user_id):
+        return f"user:feedback:{user_id}"
+    
+    @staticmethod
+    def user_parking_lots():
+        return CacheKeys.versioned("user:parking:lots:all", CacheTags.PARKING)
+    
+    @staticmethod
+    def page(key, digest):
+        return f"{key}:page:{digest}"
+    
+    @staticmethod
+    def lot_counts(lot_id):
+        # Write-through counters, not a cached payload: no tags.
+        return f"lot:counts:{lot_id}"
+    
+    @staticmethod
+    def lot_counts_generation(lot_id):
+        return f"lot:counts:{lot_id}:gen"
+    
+    @staticmethod
+    def lot_counts_building(lot_id):
+        return f"lot:counts:{lot_id}:building"
+    
+    @staticmethod
+    def free_spots(lot_id, vehicle_type):
+        return f"lot:free:{lot_id}:{vehicle_type}"
+    
+    @staticmethod
+    def spot_map(lot_id, part):
+        return f"lot:map:{lot_id}:{part}"
+    
+    @staticmethod
+    def booking_deadlines():
+        return "booking:deadlines"
+    
     @staticmethod
     def parking_lot(lot_id):
-        return f"parking:lot:{lot_id}"
+        return CacheKeys.versioned(f"parking:lot:{lot_id}", CacheTags.PARKING, CacheTags.lot(lot_id))
     
     @staticmethod
     def parking_spots(lot_id):
-        return f"parking:spots:{lot_id}"
+        return CacheKeys.versioned(f"parking:spots:{lot_id}", CacheTags.PARKING, CacheTags.lot(lot_id))
     
     @staticmethod
     def parking_availability(lot_id):
-        return f"parking:availability:{lot_id}"
+        return CacheKeys.versioned(f"parking:availability:{lot_id}", CacheTags.PARKING, CacheTags.lot(lot_id))
     
     @staticmethod
     def parking_lots_all():
-        return "parking:lots:all"
+        return CacheKeys.versioned("parking:lots:all", CacheTags.PARKING)
     
     @staticmethod
     def spot_status(lot_id,spot_number):
-        return f"spot:status:{lot_id}:{spot_number}"
+        return CacheKeys.versioned(f"spot:status:{lot_id}:{spot_number}", CacheTags.PARKING, CacheTags.lot(lot_id))
     
     @staticmethod
     def admin_revenue_daily(date=None):
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
-        return f"admin:revenue:daily:{date}"
+        return CacheKeys.versioned(f"admin:revenue:daily:{date}", CacheTags.ADMIN)
     
     @staticmethod
     def admin_usage(lot_id):
-        return f"admin:usage:{lot_id}"
+        return CacheKeys.versioned(f"admin:usage:{lot_id}", CacheTags.ADMIN)
     
     @staticmethod
     def admin_stats(date=None):
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
-        return f"admin:stats:{date}"
+        return CacheKeys.versioned(f"admin:stats:{date}", CacheTags.ADMIN)
     
     @staticmethod
     def admin_history():
-        return "admin:history:all"
+        return CacheKeys.versioned("admin:history:all", CacheTags.ADMIN)
+    
+    @staticmethod
+    def admin_parking_lots():
+        return CacheKeys.versioned("admin:parking:lots:all", CacheTags.ADMIN, CacheTags.PARKING)
+    
+    @staticmethod
+    def admin_parking_records():
+        return CacheKeys.versioned("admin:parking:records:all", CacheTags.ADMIN)
+    
+    @staticmethod
+    def admin_users():
+        return CacheKeys.versioned("admin:users:all", CacheTags.ADMIN)
+    
+    @staticmethod
+    def admin_feedback():
+        return CacheKeys.versioned("admin:feedback:all", CacheTags.ADMIN)
+
+class CacheCodecs:
+    # (codec, compression); missing libraries fall back to json/zlib.
+    DEFAULT = ("orjson", "zlib")
+    USER = ("orjson", None)
+    PARKING = ("orjson", "zlib")
+    ADMIN_BULK = ("msgpack", "zlib")
+
+    COMPRESS_THRESHOLD = 16 * 1024
+
+    FAMILIES = {
+        "user:profile": USER,
+        "user:active": USER,
+        "user:active_reservations": USER,
+        "user:parking": PARKING,
+        "parking:lots": PARKING,
+        "parking:spots": PARKING,
+        "admin:history": ADMIN_BULK,
+        "admin:parking": ADMIN_BULK,
+        "admin:users": ADMIN_BULK,
+        "admin:feedback": ADMIN_BULK,
+    }
+
+    @staticmethod
+    def for_key(key):
+        family = ":".join(key.split(":", 2)[:2])
+        return CacheCodecs.FAMILIES.get(family, CacheCodecs.DEFAULT)
+
+class CacheTags:
+    PARKING = "parking"
+    ADMIN = "admin"
+    
+    @staticmethod
+    def lot(lot_id):
+        return f"lot:{lot_id}"
+    
+    @staticmethod
+    def user(user_id):
+        return f"user:{user_id}"
+    
+    @staticmethod
+    def pages(family):
+        return f"pages:{family}"
+    
+    @staticmethod
+    def key(tag):
+        return f"tag:{tag}"
+    
+    @staticmethod
+    def is_versioned(tag):
+        return tag in (CacheTags.PARKING, CacheTags.ADMIN) or tag.startswith("lot:")
 
 class CacheTTL:
     USER_PROFILE = 3600        # 1 hr
     USER_SESSION = 7200        # 2 hrs (or token expiry)
     USER_RESERVATIONS = 600    # 10 mins
     USER_ACTIVE = 300          # 5 mins
+    USER_HISTORY = 600         # 10 mins
+    USER_FEEDBACK = 600        # 10 mins
     
     PARKING_LOT = 3600         # 1 hr
     PARKING_SPOTS = 120        # 2 mins
@@ -206,6 +995,10 @@ class CacheTTL:
     PARKING_LOTS_ALL = 1800    # 30 mins
     
     SPOT_STATUS = 120          # 2 mins
+    SPOT_MAP = 900             # 15 mins
+    SPOT_MAP_BUILD = 30        # 30 secs for a spot map build to read the DB
+    LOT_COUNTS = 3600          # 1 hr, any drift heals on the next rebuild
+    LOT_COUNTS_BUILD = 30      # 30 secs for a rebuild to read the DB
     
     ADMIN_REVENUE = 900        # 15 mins
     ADMIN_USAGE = 900          # 15 mins
@@ -213,19 +1006,23 @@ class CacheTTL:
     ADMIN_HISTORY = 600        # 10 mins
     ADMIN_RECORDS = 300        # 5 mins
     ADMIN_FEEDBACK = 600       # 10 mins
+    
+    TAG_INDEX = 7200           # 2 hrs, outlives every tagged entry
+    STALE_GRACE = 60           # 1 min of stale serving while one worker recomputes
 
-def cached(key_func,ttl=300,invalidate_on: List[str] = None):
+def cached(key_func,ttl=300,invalidate_on: List[str] = None,tags: List[str] = None,single_flight=True,beta=1.0):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             cache_key = key_func(*args, **kwargs)
-            cached_result = cache_manager.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            result = func(*args, **kwargs)
-            if result is not None:
-                cache_manager.set(cache_key, result, ttl)
+            if single_flight:
+                result = cache_manager.get_or_compute(cache_key, lambda: func(*args, **kwargs), ttl, tags=tags, beta=beta)
+            else:
+                result = cache_manager.get(cache_key)
+                if result is None:
+                    result = func(*args, **kwargs)
+                    if result is not None:
+                        cache_manager.set(cache_key, result, ttl, tags=tags)
             
             if invalidate_on:
                 for pattern in invalidate_on:
@@ -235,35 +1032,28 @@ def cached(key_func,ttl=300,invalidate_on: List[str] = None):
         return wrapper
     return decorator
 
-def invalidate_user_cache(user_id):
-    patterns = [
-        f"user:*:{user_id}",
-        f"user:*:{user_id}:*"
-    ]
-    for pattern in patterns:
-        cache_manager.delete_pattern(pattern)
+# State versions are bumped after the entries are gone, for the ETags.
 
+def invalidate_user_cache(user_id):
+    cache_manager.invalidate_tags(CacheTags.user(user_id))
+    cache_manager.bump_state(CacheTags.user(user_id))
     logger.info(f"Invalidated user cache for user_id: {user_id}")
 
 def invalidate_parking_cache(lot_id=None):
-    if lot_id:
-        patterns = [
-            f"parking:*:{lot_id}",
-            f"spot:*:{lot_id}:*"
-        ]
+    tag = CacheTags.lot(lot_id) if lot_id else CacheTags.PARKING
+    if cache_manager.versioning:
+        cache_manager.bump_generation(tag)
     else:
-        patterns = [
-            "parking:*",
-            "spot:*"
-        ]
-    
-    for pattern in patterns:
-        cache_manager.delete_pattern(pattern)
+        cache_manager.invalidate_tags(tag)
 
+    # Lot changes move the availability counts in every listing too.
+    cache_manager.bump_state(*{tag, CacheTags.PARKING})
     logger.info(f"Invalidated parking cache for lot_id: {lot_id or 'all'}")
 
 def invalidate_admin_cache():
-    patterns = ["admin:*"]
-    for pattern in patterns:
-        cache_manager.delete_pattern(pattern)
-    logger.info("Invalidated admin cache")
\ No newline at end of file
+    if cache_manager.versioning:
+        cache_manager.bump_generation(CacheTags.ADMIN)
+    else:
+        cache_manager.invalidate_tags(CacheTags.ADMIN)
+    cache_manager.bump_state(CacheTags.ADMIN)
+    logger.info("Invalidated admin cache")
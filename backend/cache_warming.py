@@ -0,0 +1,215 @@
+import logging
+import os
+import queue
+import threading
+import uuid
+from . import queries
+from .cache_utils import cache_manager, CacheKeys, CacheTTL, CacheTags, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+class Mutations:
+    BOOK = "book"
+    CANCEL = "cancel"
+    OCCUPY = "occupy"
+    RELEASE = "release"
+    EXPIRE = "expire"
+    MAINTENANCE = "maintenance"
+    SPOT_TYPE = "spot_type"
+    LOT_CREATE = "lot_create"
+    LOT_EDIT = "lot_edit"
+    LOT_DELETE = "lot_delete"
+    PROFILE = "profile"
+    FEEDBACK = "feedback"
+
+# Mutations that change spot counts or lot metadata, and therefore every
+# listing built from them.
+SPOT_CHANGES = (Mutations.BOOK, Mutations.CANCEL, Mutations.OCCUPY, Mutations.RELEASE, Mutations.EXPIRE,
+                Mutations.MAINTENANCE, Mutations.LOT_CREATE, Mutations.LOT_EDIT, Mutations.LOT_DELETE)
+RESERVATION_CHANGES = (Mutations.BOOK, Mutations.CANCEL, Mutations.OCCUPY, Mutations.RELEASE, Mutations.EXPIRE,
+                       Mutations.LOT_EDIT, Mutations.LOT_DELETE)
+
+class WarmSettings:
+    COALESCE_WINDOW = 2        # secs a queued rebuild absorbs further writes
+    MAX_CONCURRENT = 2         # rebuilds running at once across all workers
+    RETRY_DELAY = 1            # secs before a throttled rebuild retries
+    SLOT_TTL = 120             # secs before a crashed worker's slot is reclaimed
+    DISPATCH_BACKLOG = 1000    # warm requests waiting for the broker before new ones are dropped
+
+class CacheFamily:
+    # A family with no builder is cached page by page only.
+
+    def __init__(self, name, key_func, builder, ttl, tags, dirtied_by, per_lot=False, pager=None):
+        self.name = name
+        self.key_func = key_func
+        self.builder = builder
+        self.ttl = ttl
+        self.tags = tags
+        self.dirtied_by = frozenset(dirtied_by)
+        self.per_lot = per_lot
+        self.pager = pager
+
+    def key(self, lot_id=None):
+        return self.key_func(lot_id) if self.per_lot else self.key_func()
+
+    def tags_for(self, lot_id=None):
+        return self.tags(lot_id) if self.per_lot else self.tags
+
+    def build(self, lot_id=None):
+        return self.builder(lot_id) if self.per_lot else self.builder()
+
+    def read(self, lot_id=None):
+        return cache_manager.get_or_compute(
+            self.key(lot_id), lambda: self.build(lot_id), self.ttl, tags=self.tags_for(lot_id))
+
+    def read_page(self, page):
+        # Pages are cached one key each and dropped together through the
+        # family's page tag whenever the family is dirtied.
+        return cache_manager.get_or_compute(
+            CacheKeys.page(self.key(), page.digest()), lambda: self.pager(page), self.ttl,
+            tags=list(self.tags_for()) + [CacheTags.pages(self.name)])
+
+    def rebuild(self, lot_id=None):
+        if self.builder is None:
+            return None
+        return cache_manager.refresh(
+            self.key(lot_id), lambda: self.build(lot_id), self.ttl, tags=self.tags_for(lot_id))
+
+FAMILIES = {}
+
+def register(family):
+    FAMILIES[family.name] = family
+    return family
+
+register(CacheFamily('user_parking_lots', CacheKeys.user_parking_lots, queries.build_user_parking_lots,
+                     CacheTTL.PARKING_LOTS_ALL, [CacheTags.PARKING], SPOT_CHANGES))
+register(CacheFamily('parking_lots_all', CacheKeys.parking_lots_all, queries.build_parking_lots_all,
+                     CacheTTL.PARKING_LOTS_ALL, [CacheTags.PARKING], SPOT_CHANGES))
+register(CacheFamily('admin_parking_lots', CacheKeys.admin_parking_lots, queries.build_admin_parking_lots,
+                     CacheTTL.PARKING_AVAILABILITY, [CacheTags.ADMIN, CacheTags.PARKING], SPOT_CHANGES))
+register(CacheFamily('spot_grid', CacheKeys.parking_spots, queries.build_spot_grid,
+                     CacheTTL.PARKING_SPOTS, lambda lot_id: [CacheTags.PARKING, CacheTags.lot(lot_id)],
+                     SPOT_CHANGES + (Mutations.SPOT_TYPE,), per_lot=True))
+register(CacheFamily('admin_history', CacheKeys.admin_history, None,
+                     CacheTTL.ADMIN_HISTORY, [CacheTags.ADMIN], RESERVATION_CHANGES, pager=queries.admin_history_page))
+register(CacheFamily('admin_parking_records', CacheKeys.admin_parking_records, None,
+                     CacheTTL.ADMIN_RECORDS, [CacheTags.ADMIN], RESERVATION_CHANGES, pager=queries.admin_parking_records_page))
+register(CacheFamily('admin_users', CacheKeys.admin_users, None,
+                     CacheTTL.ADMIN_RECORDS, [CacheTags.ADMIN], RESERVATION_CHANGES + (Mutations.PROFILE,),
+                     pager=queries.admin_users_page))
+register(CacheFamily('admin_feedback', CacheKeys.admin_feedback, None,
+                     CacheTTL.ADMIN_FEEDBACK, [CacheTags.ADMIN], (Mutations.FEEDBACK,), pager=queries.admin_feedback_page))
+
+def read_family(name, lot_id=None):
+    return FAMILIES[name].read(lot_id)
+
+def read_family_page(name, page):
+    return FAMILIES[name].read_page(page)
+
+def families_dirtied_by(mutation):
+    return [family for family in FAMILIES.values() if mutation in family.dirtied_by]
+
+def schedule_warm(mutation, lot_id=None):
+    # Coalesced: writes while a rebuild is pending ride along with it.
+    dirtied = families_dirtied_by(mutation)
+    cache_manager.invalidate_tags(*[CacheTags.pages(family.name) for family in dirtied if family.pager])
+
+    queued = []
+    for family in dirtied:
+        if family.builder is None or (family.per_lot and lot_id is None):
+            continue
+        target = lot_id if family.per_lot else None
+        if _enqueue(family.name, target):
+            queued.append(family.name)
+    return queued
+
+def schedule_warm_all():
+    from .models import ParkingLot
+
+    queued = []
+    for family in FAMILIES.values():
+        if family.builder is None:
+            continue
+        targets = [lot_id for (lot_id,) in ParkingLot.query.with_entities(ParkingLot.id)] if family.per_lot else [None]
+        for lot_id in targets:
+            if _enqueue(family.name, lot_id):
+                queued.append(family.name)
+    return queued
+
+def _pending_key(name, lot_id):
+    return f"warm:pending:{name}:{lot_id}" if lot_id is not None else f"warm:pending:{name}"
+
+def _enqueue(name, lot_id):
+    if not cache_manager.is_available():
+        return False
+
+    try:
+        if not cache_manager._execute(cache_manager.redis_client.set, _pending_key(name, lot_id), 1,
+                                      nx=True, ex=WarmSettings.COALESCE_WINDOW + WarmSettings.SLOT_TTL):
+            return False
+
+        if not broker_breaker.allow():
+            cache_manager.delete(_pending_key(name, lot_id))
+            return False
+
+        _dispatcher().put_nowait((name, lot_id))
+        return True
+
+    except Exception as e:
+        logger.error(f"Cache warm scheduling failed for {name}: {e}")
+        cache_manager.delete(_pending_key(name, lot_id))
+        return False
+
+# Publishing to the broker happens on a background thread: a slow or
+# unreachable broker must never hold up the write that asked for a warm.
+broker_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5.0, max_reset_timeout=300.0, name="Broker")
+_dispatch = {'pid': None, 'queue': None}
+_dispatch_lock = threading.Lock()
+
+def _dispatcher():
+    with _dispatch_lock:
+        if _dispatch['pid'] != os.getpid():
+            _dispatch['queue'] = queue.Queue(maxsize=WarmSettings.DISPATCH_BACKLOG)
+            _dispatch['pid'] = os.getpid()
+            threading.Thread(target=_publish_loop, args=(_dispatch['queue'],), name="cache-warm-dispatch",
+                             daemon=True).start()
+        return _dispatch['queue']
+
+def _publish_loop(pending):
+    from .tasks import warm_cache_family
+
+    while True:
+        name, lot_id = pending.get()
+        if not broker_breaker.allow():
+            cache_manager.delete(_pending_key(name, lot_id))
+            continue
+        try:
+            warm_cache_family.apply_async(args=[name, lot_id], countdown=WarmSettings.COALESCE_WINDOW, retry=False)
+            broker_breaker.record_success()
+        except Exception as e:
+            logger.error(f"Cache warm dispatch failed for {name}: {e}")
+            broker_breaker.record_failure()
+            cache_manager.delete(_pending_key(name, lot_id))
+
+def _slot_key(index):
+    return f"warm:slot:{index}"
+
+def acquire_slot():
+    # Each slot is a lease that expires on its own, so a worker that dies
+    # mid-rebuild frees its slot after SLOT_TTL without anyone releasing it.
+    token = uuid.uuid4().hex
+    for index in range(WarmSettings.MAX_CONCURRENT):
+        if cache_manager._execute(cache_manager.redis_client.set, _slot_key(index), token,
+                                  nx=True, ex=WarmSettings.SLOT_TTL):
+            return _slot_key(index), token
+    return None
+
+def release_slot(slot):
+    key, token = slot
+    cache_manager._execute(cache_manager.release_lock_script, keys=[key], args=[token])
+
+def warm_family(name, lot_id=None):
+    # Clear the pending flag before building, so a write that lands while we
+    # rebuild queues a fresh pass instead of being absorbed into this one.
+    cache_manager.delete(_pending_key(name, lot_id))
+    return FAMILIES[name].rebuild(lot_id)
@@ -39,10 +39,23 @@ def create_celery_app():
             'task': 'tasks.cleanup_old_exports',
             'schedule': crontab(day_of_week=0, hour=0, minute=0),
         },
+        'expire-due-bookings': {
+            'task': 'tasks.expire_due_bookings',
+            'schedule': crontab(),
+        },
         'auto-cancel-expired-bookings': {
             'task': 'tasks.auto_cancel_expired_bookings',
             'schedule': crontab(minute=0), 
         },
+        'sqlite-wal-checkpoint': {
+            'task': 'tasks.sqlite_maintenance',
+            'schedule': crontab(minute='*/10'),
+        },
+        'sqlite-optimize': {
+            'task': 'tasks.sqlite_maintenance',
+            'schedule': crontab(hour=21, minute=30), #IST 3:00 AM
+            'kwargs': {'optimize': True},
+        },
     }
     celery.conf.timezone = 'UTC'
 
@@ -0,0 +1,118 @@
+from datetime import datetime
+from sqlalchemy import inspect, select, text
+from .models import db, MaintenanceRequest, ParkingSpot, Reservation
+
+# db.create_all() only creates missing tables, so anything added to an
+# existing table (columns, indexes) is brought in here. Every step is
+# idempotent and runs on each startup right after create_all().
+
+def create_missing_indexes():
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not table.indexes:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                print(f'Created index {index.name}')
+
+def add_reservation_lot_id():
+    columns = {column['name'] for column in inspect(db.engine).get_columns('reservations')}
+    if 'lot_id' in columns:
+        return
+
+    with db.engine.begin() as connection:
+        connection.execute(text('ALTER TABLE reservations ADD COLUMN lot_id INTEGER REFERENCES parking_lots (id)'))
+        # The spot still knows its lot; fall back to the old name match only
+        # for reservations whose spot has since been removed.
+        connection.execute(text(
+            'UPDATE reservations SET lot_id = '
+            '(SELECT lot_id FROM parking_spots WHERE parking_spots.id = reservations.spot_id)'))
+        connection.execute(text(
+            'UPDATE reservations SET lot_id = '
+            '(SELECT id FROM parking_lots WHERE lower(parking_lots.prime_location_name) = lower(reservations.prime_location_name)) '
+            'WHERE lot_id IS NULL'))
+    print('Added reservations.lot_id')
+
+def rebuild_sqlite_table(table):
+    # SQLite can't relax a column constraint in place: copy the rows into a
+    # fresh table built from the model. The indexes are recreated with it.
+    inspector = inspect(db.engine)
+    columns = ', '.join(column['name'] for column in inspector.get_columns(table.name) if column['name'] in table.c)
+    with db.engine.begin() as connection:
+        for index in inspector.get_indexes(table.name):
+            connection.execute(text(f'DROP INDEX {index["name"]}'))
+        connection.execute(text(f'ALTER TABLE {table.name} RENAME TO {table.name}_old'))
+        table.create(bind=connection)
+        connection.execute(text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old'))
+        connection.execute(text(f'DROP TABLE {table.name}_old'))
+
+def allow_detached_spot_history():
+    # Removing a spot keeps its past reservations and maintenance requests
+    # with spot_id set to NULL.
+    for model in (Reservation, MaintenanceRequest):
+        table = model.__table__
+        columns = {column['name']: column for column in inspect(db.engine).get_columns(table.name)}
+        if columns['spot_id']['nullable']:
+            continue
+
+        if db.engine.dialect.name == 'sqlite':
+            rebuild_sqlite_table(table)
+        else:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN spot_id DROP NOT NULL'))
+        print(f'Made {table.name}.spot_id nullable')
+
+MIGRATIONS = [
+    add_reservation_lot_id,
+    allow_detached_spot_history,
+    create_missing_indexes,
+]
+
+def upgrade_db():
+    for migration in MIGRATIONS:
+        migration()
+
+# The queries behind the hot paths, by the index each is meant to use.
+HOT_QUERIES = {
+    'ix_reservations_user_open': select(Reservation.id).where(
+        Reservation.user_id == 1, Reservation.leaving_timestamp.is_(None)),
+    'ix_reservations_spot_status_open': select(Reservation.id).where(
+        Reservation.spot_id == 1, Reservation.booking_status == 'booked', Reservation.leaving_timestamp.is_(None)),
+    'ix_reservations_status_booked_at': select(Reservation.id).where(
+        Reservation.booking_status == 'booked', Reservation.booking_timestamp < datetime(2000, 1, 1)),
+    'ix_reservations_vehicle_open': select(Reservation.id).where(
+        Reservation.vehicle_number == 'X', Reservation.leaving_timestamp.is_(None)),
+    'ix_parking_spots_lot_status': select(ParkingSpot.id).where(
+        ParkingSpot.lot_id == 1, ParkingSpot.status == 'A'),
+}
+
+def query_plan(statement):
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as connection:
+        return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)]
+
+def check_query_plans():
+    # Every hot query must go through its index, per EXPLAIN QUERY PLAN.
+    if db.engine.dialect.name != 'sqlite':
+        return {}
+
+    plans, failures = {}, []
+    for index_name, statement in HOT_QUERIES.items():
+        plan = query_plan(statement)
+        plans[index_name] = plan
+        if not any(index_name in step for step in plan):
+            failures.append(f'{index_name}: {" / ".join(plan)}')
+
+    assert not failures, 'Hot queries not using their index:\n' + '\n'.join(failures)
+    return plans
+
+if __name__ == '__main__':
+    from .app import app
+
+    with app.app_context():
+        upgrade_db()
+        for index_name, plan in check_query_plans().items():
+            print(f'{index_name}: {" / ".join(plan)}')
@@ -40,6 +40,9 @@ class ParkingLot(db.Model):
 
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spots'
+    __table_args__ = (
+        db.Index('ix_parking_spots_lot_status', 'lot_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), nullable=False)
@@ -56,12 +59,22 @@ class ParkingSpot(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        db.Index('ix_reservations_user_open', 'user_id', 'leaving_timestamp'),
+        db.Index('ix_reservations_spot_status_open', 'spot_id', 'booking_status', 'leaving_timestamp'),
+        db.Index('ix_reservations_status_booked_at', 'booking_status', 'booking_timestamp'),
+        db.Index('ix_reservations_vehicle_open', 'vehicle_number', 'leaving_timestamp'),
+        db.Index('ix_reservations_lot', 'lot_id'),
+        db.Index('ix_reservations_booked_at', 'booking_timestamp'),
+        db.Index('ix_reservations_user_booked_at', 'user_id', 'booking_timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     user_name = db.Column(db.String(100), nullable=False)
-    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'), nullable=False)
-    prime_location_name = db.Column(db.String(100), nullable=False)
+    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'))  # NULL once the spot is removed
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'))
+    prime_location_name = db.Column(db.String(100), nullable=False)  # lot name at booking time
     vehicle_number = db.Column(db.String(20), nullable=False)
     booking_timestamp = db.Column(db.DateTime, default= datetime.utcnow() + timedelta(hours=5, minutes=30)) 
     occupancy_timestamp = db.Column(db.DateTime)
@@ -72,12 +85,19 @@ class Reservation(db.Model):
     parking_timestamp = db.Column(db.DateTime)
     loyalty_points_redeemed = db.Column(db.Integer, default=0)  # Track redeemed points for discount calculation
 
+    lot = db.relationship('ParkingLot', lazy='select')  # joinedload it where location_name is read
+
+    @property
+    def location_name(self):
+        # The lot's current name; the stored one only outlives a deleted lot.
+        return self.lot.prime_location_name if self.lot else self.prime_location_name
+
 
 class MaintenanceRequest(db.Model):
     __tablename__ = 'maintenance_requests'
 
     id = db.Column(db.Integer, primary_key=True)
-    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'), nullable=False)
+    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'))  # NULL once the spot is removed
     prime_location_name = db.Column(db.String(100), nullable=False)
     issue_description = db.Column(db.Text, nullable=False)
     status = db.Column(db.String(20), default='Open')  
@@ -87,6 +107,9 @@ class MaintenanceRequest(db.Model):
 
 class UserFeedback(db.Model):
     __tablename__ = 'user_feedback'
+    __table_args__ = (
+        db.Index('ix_user_feedback_submitted_at', 'submitted_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
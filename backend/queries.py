@@ -0,0 +1,425 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from .models import db, User, ParkingLot, ParkingSpot, Reservation, UserFeedback
+from .pagination import Filter, parse_datetime
+from .spot_state import SpotCounts, lot_counts
+
+HISTORY_BATCH_SIZE = 5000
+
+# Builders for the shared cache families. They return plain JSON-ready data
+# and need only an app context, so both the request handlers and the
+# background warmer in cache_warming can call them.
+
+def build_user_parking_lots():
+    lots = ParkingLot.query.all()
+    counts = lot_counts(lot.id for lot in lots)
+    data = []
+    for lot in lots:
+        available_spots = counts[lot.id][SpotCounts.AVAILABLE]
+
+        data.append({
+            'id': lot.id,
+            'name': lot.prime_location_name,
+            'capacity': lot.total_number_of_spots,
+            'available': available_spots,
+            'price_per_hour': lot.price_per_hour,
+            'location': lot.address
+        })
+    return data
+
+def build_parking_lots_all():
+    lots = ParkingLot.query.all()
+    counts = lot_counts(lot.id for lot in lots)
+    data = []
+    for lot in lots:
+        available_spots = counts[lot.id][SpotCounts.AVAILABLE]
+        data.append({
+            'id': lot.id,
+            'prime_location_name': lot.prime_location_name,
+            'address': lot.address,
+            'pin_code': lot.pin_code,
+            'price_per_hour': lot.price_per_hour,
+            'available_spots': available_spots
+        })
+    return data
+
+def build_admin_parking_lots():
+    lots = ParkingLot.query.all()
+    counts = lot_counts(lot.id for lot in lots)
+    data = []
+    for lot in lots:
+        lot_count = counts[lot.id]
+        data.append({
+            'id': lot.id,
+            'name': lot.prime_location_name,
+            'address': lot.address,
+            'pin_code': lot.pin_code,
+            'capacity': lot_count[SpotCounts.TOTAL],
+            'available': lot_count[SpotCounts.AVAILABLE],
+            'occupied': lot_count[SpotCounts.OCCUPIED],
+            'maintenance': lot_count[SpotCounts.MAINTENANCE],
+            'price_per_hour': lot.price_per_hour,
+            'created_at': lot.created_at.isoformat() if lot.created_at else None
+        })
+    return data
+
+def build_spot_grid(lot_id):
+    # Viewer-neutral: admin_spot_view() and user_spot_view() project from it.
+    if db.session.get(ParkingLot, lot_id) is None:
+        return None
+
+    spots = db.session.query(
+        ParkingSpot.id,
+        ParkingSpot.spot_number,
+        ParkingSpot.status,
+        ParkingSpot.vehicle_type_supported,
+        ParkingSpot.is_under_maintenance,
+        ParkingSpot.maintenance_reason,
+        ParkingSpot.maintenance_started_at
+    ).filter(ParkingSpot.lot_id == lot_id).order_by(ParkingSpot.id).all()
+
+    open_reservations = db.session.query(
+        Reservation.spot_id,
+        Reservation.id,
+        Reservation.user_id,
+        Reservation.user_name,
+        Reservation.vehicle_number,
+        Reservation.booking_status,
+        Reservation.booking_timestamp,
+        Reservation.parking_timestamp
+    ).join(ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).filter(ParkingSpot.lot_id == lot_id, Reservation.leaving_timestamp.is_(None)
+    ).order_by(Reservation.id)
+
+    occupying, booking = {}, {}
+    for (spot_id, reservation_id, user_id, user_name, vehicle_number, booking_status,
+         booking_timestamp, parking_timestamp) in open_reservations:
+        reservation = {
+            'id': reservation_id,
+            'user_id': user_id,
+            'user_name': user_name,
+            'vehicle_number': vehicle_number,
+            'booking_timestamp': booking_timestamp.isoformat() if booking_timestamp else None,
+            'parking_timestamp': parking_timestamp.isoformat() if parking_timestamp else None
+        }
+        occupying.setdefault(spot_id, reservation)
+        if booking_status == 'booked':
+            booking.setdefault(spot_id, reservation)
+
+    data = []
+    for (spot_id, spot_number, status, vehicle_type, under_maintenance, maintenance_reason,
+         maintenance_started_at) in spots:
+        reservation = None
+        if status == 'O':
+            reservation = occupying.get(spot_id)
+        elif status == 'B':
+            reservation = booking.get(spot_id)
+
+        data.append({
+            'id': spot_id,
+            'spot_number': spot_number,
+            'status': status,
+            'vehicle_type': vehicle_type,
+            'is_under_maintenance': under_maintenance,
+            'maintenance_reason': maintenance_reason,
+            'maintenance_started_at': maintenance_started_at.isoformat() if maintenance_started_at else None,
+            'reservation': reservation
+        })
+
+    return data
+
+def admin_spot_view(grid):
+    data = []
+    for spot in grid or []:
+        reservation = spot['reservation'] or {}
+        data.append({
+            'id': spot['id'],
+            'spot_number': spot['spot_number'],
+            'status': spot['status'],
+            'vehicle_type': spot['vehicle_type'],
+            'is_occupied': spot['status'] == 'O',
+            'is_booked': spot['status'] == 'B',
+            'is_maintenance': spot['is_under_maintenance'],
+            'maintenance_reason': spot['maintenance_reason'],
+            'maintenance_started_at': spot['maintenance_started_at'],
+            'vehicle_number': reservation.get('vehicle_number'),
+            'user_name': reservation.get('user_name'),
+            'parking_timestamp': reservation.get('parking_timestamp'),
+            'booking_timestamp': reservation.get('booking_timestamp')
+        })
+
+    return data
+
+def user_spot_view(grid, current_user_id):
+    current_time = datetime.utcnow() + timedelta(hours=5, minutes=30)
+    data = []
+    for spot in grid:
+        spot_data = {
+            'id': spot['id'],
+            'spot_number': spot['spot_number'],
+            'status': spot['status'],
+            'vehicle_type': spot['vehicle_type'],
+            'is_available': spot['status'] == 'A',
+            'is_booked': spot['status'] == 'B',
+            'is_occupied': spot['status'] == 'O',
+            'is_maintenance': spot['status'] == 'M' or spot['is_under_maintenance']
+        }
+
+        booking = spot['reservation']
+        if spot['status'] == 'B' and booking:
+            booking_expiry = datetime.fromisoformat(booking['booking_timestamp']) + timedelta(hours=12)
+            own_booking = booking['user_id'] == current_user_id
+            spot_data.update({
+                'booking_id': booking['id'],
+                'booked_by_current_user': own_booking,
+                'booking_expires_at': booking_expiry.isoformat(),
+                'booking_expired': current_time > booking_expiry,
+                'vehicle_number': booking['vehicle_number'] if own_booking else None
+            })
+
+        data.append(spot_data)
+
+    return data
+
+RESERVATION_FILTERS = {
+    'lot': Filter(lambda lot_id: Reservation.lot_id == lot_id, int),
+    'status': Filter(lambda status: Reservation.booking_status == status),
+    'vehicle': Filter(lambda vehicle: Reservation.vehicle_number == vehicle),
+    'from': Filter(lambda start: Reservation.booking_timestamp >= start, parse_datetime),
+    'to': Filter(lambda end: Reservation.booking_timestamp < end, lambda raw: parse_datetime(raw, end=True)),
+}
+
+FEEDBACK_FILTERS = {
+    'lot': Filter(lambda lot_id: UserFeedback.parking_lot_id == lot_id, int),
+    'status': Filter(lambda status: UserFeedback.status == status),
+    'from': Filter(lambda start: UserFeedback.submitted_at >= start, parse_datetime),
+    'to': Filter(lambda end: UserFeedback.submitted_at < end, lambda raw: parse_datetime(raw, end=True)),
+}
+
+USER_FILTERS = {
+    'lot': Filter(lambda lot_id: Reservation.lot_id == lot_id, int),
+}
+
+def reservation_key(row):
+    return row.booking_timestamp, row.id
+
+# Full lists use the order the pager walks, so both modes agree.
+RESERVATION_ORDER = (Reservation.booking_timestamp.desc().nulls_last(), Reservation.id.desc())
+
+def _lot_rates():
+    return {lot_id: (name, price) for lot_id, name, price in
+            db.session.query(ParkingLot.id, ParkingLot.prime_location_name, ParkingLot.price_per_hour)}
+
+def _history_query():
+    return db.session.query(
+        Reservation.id,
+        Reservation.user_id,
+        User.username,
+        Reservation.lot_id,
+        Reservation.prime_location_name,
+        ParkingSpot.spot_number,
+        Reservation.vehicle_number,
+        Reservation.booking_timestamp,
+        Reservation.booking_status,
+        Reservation.parking_timestamp,
+        Reservation.leaving_timestamp,
+        Reservation.parking_cost
+    ).outerjoin(User, User.id == Reservation.user_id
+    ).outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+
+def _history_row(row, lots):
+    (reservation_id, user_id, username, lot_id, booked_location, spot_number, vehicle_number,
+     booking_timestamp, booking_status, parking_timestamp, leaving_timestamp, parking_cost) = row
+    lot_name, base_rate = lots.get(lot_id, (None, None))
+    duration_hours = None
+    end_time_str = None
+    cost = 0
+    breakdown = {}
+    if leaving_timestamp:
+        duration = leaving_timestamp - parking_timestamp
+        duration_hours = round(duration.total_seconds() / 3600, 2)
+        end_time_str = leaving_timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        cost = parking_cost or 0
+        if base_rate is not None and cost == 0:
+            cost = round(duration_hours * base_rate, 2)
+            breakdown = {
+                'base_rate': base_rate,
+                'duration_hours': duration_hours,
+                'total_cost': cost
+            }
+
+    return {
+        'id': reservation_id,
+        'user_id': user_id,
+        'user_name': username or 'Unknown User',
+        'location': lot_name or booked_location,
+        'spot_number': spot_number or 'N/A',
+        'vehicle_number': vehicle_number,
+        'booking_timestamp': booking_timestamp.strftime("%Y-%m-%d %H:%M:%S") if booking_timestamp else None,
+        'booking_status': booking_status,
+        'start_time': parking_timestamp.strftime("%Y-%m-%d %H:%M:%S") if parking_timestamp else None,
+        'end_time': end_time_str,
+        'cost': cost,
+        'cost_breakdown': breakdown
+    }
+
+def _stream(query, to_row):
+    # Batches are handed on as they fill, so a full list is never held in
+    # memory or cached as one value.
+    batch = []
+    for item in query.yield_per(HISTORY_BATCH_SIZE):
+        batch.append(to_row(item))
+        if len(batch) == HISTORY_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_admin_history():
+    # Lots are few and reservations many: names and prices come from one id map.
+    lots = _lot_rates()
+    return _stream(_history_query().order_by(*RESERVATION_ORDER), lambda row: _history_row(row, lots))
+
+def admin_history_page(page):
+    rows, next_cursor = page.fetch(_history_query(), RESERVATION_FILTERS,
+                                   Reservation.booking_timestamp, Reservation.id, reservation_key)
+    lots = _lot_rates()
+    return {'items': [_history_row(row, lots) for row in rows], 'next_cursor': next_cursor}
+
+def _records_query():
+    # One joined projection instead of a User and a ParkingSpot lookup per
+    # reservation; rows stay plain tuples, nothing is hydrated.
+    return db.session.query(
+        Reservation.id,
+        User.username,
+        Reservation.user_name,
+        ParkingLot.prime_location_name.label('lot_name'),
+        Reservation.prime_location_name,
+        ParkingSpot.spot_number,
+        Reservation.vehicle_number,
+        Reservation.parking_timestamp,
+        Reservation.leaving_timestamp,
+        Reservation.parking_cost,
+        Reservation.booking_status,
+        Reservation.booking_timestamp,
+        Reservation.occupancy_timestamp
+    ).outerjoin(User, User.id == Reservation.user_id
+    ).outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id)
+
+def _record_row(row):
+    (reservation_id, username, booked_name, lot_name, booked_location, spot_number, vehicle_number,
+     parking_timestamp, leaving_timestamp, parking_cost, booking_status, booking_timestamp,
+     occupancy_timestamp) = row
+    duration_hours = None
+    if parking_timestamp and leaving_timestamp:
+        duration = leaving_timestamp - parking_timestamp
+        duration_hours = round(duration.total_seconds() / 3600, 2)
+
+    status_display = booking_status or 'completed'
+    if booking_status in ['cancelled', 'auto_cancelled']:
+        status_display = 'Cancelled'
+
+    elif leaving_timestamp:
+        status_display = 'Completed'
+    elif booking_status == 'occupied':
+        status_display = 'Active'
+
+    elif booking_status == 'booked':
+        status_display = 'Booked'
+
+    return {
+        'id': reservation_id,
+        'user_name': username or booked_name or 'Unknown',
+        'prime_location_name': lot_name or booked_location or 'Unknown',
+        'spot_number': spot_number or 'Unknown',
+        'vehicle_number': vehicle_number or 'N/A',
+        'start_time': parking_timestamp.isoformat() if parking_timestamp else None,
+        'end_time': leaving_timestamp.isoformat() if leaving_timestamp else None,
+        'cost': float(parking_cost) if parking_cost else 0.0,
+        'duration_hours': duration_hours,
+        'booking_status': status_display,
+        'booking_timestamp': booking_timestamp.isoformat() if booking_timestamp else None,
+        'occupancy_timestamp': occupancy_timestamp.isoformat() if occupancy_timestamp else None
+    }
+
+def stream_admin_parking_records():
+    return _stream(_records_query().order_by(*RESERVATION_ORDER), _record_row)
+
+def admin_parking_records_page(page):
+    rows, next_cursor = page.fetch(_records_query(), RESERVATION_FILTERS,
+                                   Reservation.booking_timestamp, Reservation.id, reservation_key)
+    return {'items': [_record_row(row) for row in rows], 'next_cursor': next_cursor}
+
+def _users_query():
+    # Each user's open reservation, picked by a correlated subquery that the
+    # (user_id, leaving_timestamp) index answers, so the listing is one query.
+    open_reservation = db.session.query(func.min(Reservation.id)).filter(
+        Reservation.user_id == User.id,
+        Reservation.leaving_timestamp.is_(None)
+    ).correlate(User).scalar_subquery()
+
+    return db.session.query(
+        User.id,
+        User.username,
+        User.email,
+        User.role,
+        User.phone_number,
+        User.loyalty_points,
+        User.profile_created_at,
+        ParkingSpot.spot_number,
+        ParkingLot.prime_location_name.label('lot_name'),
+        Reservation.id.label('reservation_id'),
+        Reservation.prime_location_name
+    ).outerjoin(Reservation, Reservation.id == open_reservation
+    ).outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id
+    ).filter(User.role != 'admin')
+
+def _user_row(row):
+    (user_id, username, email, role, phone_number, loyalty_points, profile_created_at,
+     spot_number, lot_name, reservation_id, booked_location) = row
+    return {
+        'id': user_id,
+        'username': username,
+        'email': email,
+        'role': role or 'user',
+        'phone_number': phone_number,
+        'loyalty_points': loyalty_points or 0,
+        'profile_created_at': profile_created_at.isoformat() if profile_created_at else None,
+        'current_spot': spot_number,
+        'location': (lot_name or booked_location) if reservation_id else None
+    }
+
+def stream_admin_users():
+    return _stream(_users_query(), _user_row)
+
+def admin_users_page(page):
+    rows, next_cursor = page.fetch(_users_query(), USER_FILTERS, None, User.id,
+                                   lambda row: (None, row.id), descending=False)
+    return {'items': [_user_row(row) for row in rows], 'next_cursor': next_cursor}
+
+def _feedback_row(feedback):
+    return {
+        'id': feedback.id,
+        'user_id': feedback.user_id,
+        'user_name': feedback.user_name,
+        'user_email': feedback.user_email,
+        'user_phone': feedback.user_phone,
+        'parking_lot_name': feedback.parking_lot_name,
+        'spot_number': feedback.spot_number,
+        'issue_category': feedback.issue_category,
+        'description': feedback.description,
+        'status': feedback.status,
+        'admin_response': feedback.admin_response,
+        'submitted_at': feedback.submitted_at.isoformat() if feedback.submitted_at else None,
+        'updated_at': feedback.updated_at.isoformat() if feedback.updated_at else None
+    }
+
+def stream_admin_feedback():
+    return _stream(UserFeedback.query.order_by(UserFeedback.submitted_at.desc()), _feedback_row)
+
+def admin_feedback_page(page):
+    rows, next_cursor = page.fetch(UserFeedback.query, FEEDBACK_FILTERS, UserFeedback.submitted_at,
+                                   UserFeedback.id, lambda feedback: (feedback.submitted_at, feedback.id))
+    return {'items': [_feedback_row(feedback) for feedback in rows], 'next_cursor': next_cursor}
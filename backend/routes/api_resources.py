@@ -1,16 +1,25 @@
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from flask_restful import Resource
+from sqlalchemy.orm import joinedload
 from functools import wraps
+import json
 import jwt
 import os
 from datetime import datetime, timedelta
 
 from ..models import db, User, ParkingLot, ParkingSpot, Reservation, UserFeedback, MaintenanceRequest
-from ..cache_utils import cache_manager, CacheKeys, CacheTTL, invalidate_parking_cache, invalidate_user_cache, invalidate_admin_cache
+from ..cache_utils import cache_manager, CacheKeys, CacheTTL, CacheTags, invalidate_parking_cache, invalidate_user_cache, invalidate_admin_cache
+from ..cache_warming import Mutations, read_family, read_family_page, schedule_warm
+from ..pagination import PageRequest
+from ..queries import (RESERVATION_FILTERS, RESERVATION_ORDER, FEEDBACK_FILTERS, USER_FILTERS, reservation_key, admin_spot_view,
+                       user_spot_view, stream_admin_feedback, stream_admin_parking_records, stream_admin_users)
+from ..spot_state import allocate_spot, allocate_spots, compare_and_set, spot_map
 
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
 JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+MAX_BATCH_BOOKING = 50
+VEHICLE_TYPES = ('non-EV', 'EV')
 
 def auth_required(f):
     @wraps(f)
@@ -64,6 +73,72 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def conditional(scopes, max_age=None):
+    # scopes maps the URL arguments to CacheTags; max_age rolls the ETag for time-derived fields.
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = cache_manager.state_etag(scopes(**kwargs), max_age)
+            if etag is None:
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            result = f(*args, **kwargs)
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+            if isinstance(result, Response):
+                if result.status_code == 200:
+                    result.headers.extend(headers)
+                return result
+
+            if isinstance(result, dict):
+                return result, 200, headers
+            return result
+        return decorated_function
+    return decorator
+
+def stream_list(name, batches):
+    # Unpaged admin lists go out batch by batch instead of as one cached blob.
+    def generate():
+        yield '{"success": true, "%s": [' % name
+        separator = ''
+        for batch in batches:
+            yield separator + ','.join(json.dumps(row) for row in batch)
+            separator = ','
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def delete_spots(spots):
+    # Past reservations and maintenance requests outlive the spot, detached
+    # from it; callers make sure none of these spots has an open reservation.
+    spot_ids = [spot.id for spot in spots]
+    if spot_ids:
+        Reservation.query.filter(Reservation.spot_id.in_(spot_ids)).update(
+            {'spot_id': None}, synchronize_session=False)
+        MaintenanceRequest.query.filter(MaintenanceRequest.spot_id.in_(spot_ids)).update(
+            {'spot_id': None}, synchronize_session=False)
+
+    for spot in spots:
+        db.session.delete(spot)
+
+def delete_lot(lot):
+    spots = ParkingSpot.query.filter_by(lot_id=lot.id).all()
+    if spots:
+        MaintenanceRequest.query.filter(MaintenanceRequest.spot_id.in_([spot.id for spot in spots])).delete(
+            synchronize_session=False)
+    delete_spots(spots)
+    Reservation.query.filter(
+        Reservation.lot_id == lot.id,
+        Reservation.leaving_timestamp.is_not(None)
+    ).delete(synchronize_session=False)
+    UserFeedback.query.filter_by(parking_lot_id=lot.id).update({'parking_lot_id': None}, synchronize_session=False)
+    db.session.delete(lot)
+
 def create_access_token(user_id):
     payload = {
         'user_id': user_id,
@@ -227,7 +302,7 @@ class ProfileResource(Resource):
             'created_at': user.profile_created_at.isoformat() if user.profile_created_at else None
         }
         
-        cache_manager.set(cache_key, user_data, CacheTTL.USER_PROFILE)
+        cache_manager.set(cache_key, user_data, CacheTTL.USER_PROFILE, tags=[CacheTags.user(current_user_id)])
         return {'success': True, 'user': user_data}, 200
 
 class UserFeedbackResource(Resource):
@@ -261,6 +336,7 @@ class UserFeedbackResource(Resource):
             db.session.commit()
 
             invalidate_user_cache(current_user_id)
+            schedule_warm(Mutations.FEEDBACK)
             return {'success': True, 'message': 'Feedback submitted successfully'}, 201
 
         except Exception as e:
@@ -271,7 +347,7 @@ class UserFeedbackResource(Resource):
     def get(self):
         try:
             current_user_id = request.current_user_id
-            cache_key = f"user:feedback:{current_user_id}"
+            cache_key = CacheKeys.user_feedback(current_user_id)
             cached_feedback = cache_manager.get(cache_key)
             if cached_feedback:
                 return {'success': True, 'feedback': cached_feedback}
@@ -294,7 +370,7 @@ class UserFeedbackResource(Resource):
                     'updated_at': feedback.updated_at.isoformat() if feedback.updated_at else None
                 })
             
-            cache_manager.set(cache_key, feedback_data, 600) 
+            cache_manager.set(cache_key, feedback_data, CacheTTL.USER_FEEDBACK, tags=[CacheTags.user(current_user_id)])
             
             return {'success': True, 'feedback': feedback_data}
             
@@ -303,86 +379,40 @@ class UserFeedbackResource(Resource):
 
 class UserParkingLotsResource(Resource):
     @auth_required
+    @conditional(lambda: [CacheTags.PARKING])
     def get(self):
-        cache_key = "user:parking:lots:all"
-        cached_lots = cache_manager.get(cache_key)
-        if cached_lots:
-            return {'success': True, 'parking_lots': cached_lots}
-
-        lots = ParkingLot.query.all()
-        data = []
-        for lot in lots:
-            available_spots = sum(1 for s in lot.spots if s.status == 'A' and not s.is_under_maintenance)
-
-            data.append({
-                'id': lot.id,
-                'name': lot.prime_location_name,
-                'capacity': lot.total_number_of_spots, 
-                'available': available_spots, 
-                'price_per_hour': lot.price_per_hour,
-                'location': lot.address 
-            })
-
-        cache_manager.set(cache_key, data, CacheTTL.PARKING_LOTS_ALL)
-
+        data = read_family('user_parking_lots')
         return {'success': True, 'parking_lots': data}
 
 class UserParkingLotSpotsResource(Resource):
     @auth_required
+    @conditional(lambda lot_id: [CacheTags.PARKING, CacheTags.lot(lot_id), CacheTags.user(request.current_user_id)],
+                 max_age=CacheTTL.PARKING_SPOTS)
     def get(self, lot_id):
-        current_user_id = request.current_user_id
-        cache_key = f"user:parking:spots:{lot_id}"
-        cached_spots = cache_manager.get(cache_key)
-        if cached_spots:
-            return {'success': True, 'spots': cached_spots}
-
-        lot = db.session.get(ParkingLot, lot_id)
-        if not lot:
+        grid = read_family('spot_grid', lot_id)
+        if grid is None:
             return {'success': False, 'message': 'Parking lot not found'}, 404
 
-        spots = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-        data = []
+        return {'success': True, 'spots': user_spot_view(grid, request.current_user_id)}
 
-        for spot in spots:
-            spot_data = {
-                'id': spot.id,
-                'spot_number': spot.spot_number,
-                'status': spot.status,
-                'vehicle_type': spot.vehicle_type_supported,
-                'is_available': spot.status == 'A',
-                'is_booked': spot.status == 'B',
-                'is_occupied': spot.status == 'O',
-                'is_maintenance': spot.status == 'M' or spot.is_under_maintenance
-            }
-
-            if spot.status == 'B':
-                booking = Reservation.query.filter_by(
-                    spot_id=spot.id,
-                    booking_status='booked',
-                    leaving_timestamp=None).first()
-
-                if booking:
-                    current_time = datetime.utcnow() + timedelta(hours=5, minutes=30)
-                    booking_expiry = booking.booking_timestamp + timedelta(hours=12)
-
-                    spot_data.update({
-                        'booking_id': booking.id,
-                        'booked_by_current_user': booking.user_id == current_user_id,
-                        'booking_expires_at': booking_expiry.isoformat(),
-                        'booking_expired': current_time > booking_expiry,
-                        'vehicle_number': booking.vehicle_number if booking.user_id == current_user_id else None
-                    })
-
-            data.append(spot_data)
+class UserParkingLotSpotMapResource(Resource):
+    @auth_required
+    @conditional(lambda lot_id: [CacheTags.PARKING, CacheTags.lot(lot_id)])
+    def get(self, lot_id):
+        data = spot_map(lot_id)
+        if data is None:
+            return {'success': False, 'message': 'Parking lot not found'}, 404
 
-        cache_manager.set(cache_key, data, CacheTTL.PARKING_SPOTS)
-        return {'success': True, 'spots': data}
+        # Polling clients keep the layout from the first response.
+        if request.args.get('layout', 'true').lower() == 'false':
+            data.pop('layout')
+        return {'success': True, 'spot_map': data}
 
 class UserActiveReservationsResource(Resource):
     @auth_required
     def get(self):
         current_user_id = request.current_user_id
-        cache_key = f"user:active_reservations:{current_user_id}"
+        cache_key = CacheKeys.user_active_reservations(current_user_id)
         cached_reservations = cache_manager.get(cache_key)
 
         if cached_reservations:
@@ -399,7 +429,7 @@ class UserActiveReservationsResource(Resource):
             spot = db.session.get(ParkingSpot, reservation.spot_id)
             data.append({
                 'id': reservation.id,
-                'prime_location_name': reservation.prime_location_name,
+                'prime_location_name': reservation.location_name,
                 'spot_number': spot.spot_number if spot else 'N/A',
                 'vehicle_number': reservation.vehicle_number,
                 'parking_timestamp': reservation.parking_timestamp.isoformat() if reservation.parking_timestamp else None,
@@ -407,9 +437,91 @@ class UserActiveReservationsResource(Resource):
                 'booking_status': reservation.booking_status
             })
 
-        cache_manager.set(cache_key, data, CacheTTL.USER_RESERVATIONS)
+        cache_manager.set(cache_key, data, CacheTTL.USER_RESERVATIONS, tags=[CacheTags.user(current_user_id)])
         return {'success': True, 'active_reservations': data}
 
+def check_booking(current_user_id, vehicle_numbers, points_to_redeem):
+    # Returns (user, None) or (None, error response).
+    user = db.session.get(User, current_user_id)
+    if not user:
+        return None, ({'success': False, 'message': 'User not found'}, 404)
+
+    if points_to_redeem > 0 and (user.loyalty_points or 0) < points_to_redeem:
+        return None, ({'success': False, 'message': 'Insufficient loyalty points'}, 400)
+
+    existing_occupied_reservation = Reservation.query.filter(
+        Reservation.vehicle_number.in_(vehicle_numbers),
+        Reservation.leaving_timestamp.is_(None)
+    ).join(ParkingSpot).filter(
+        ParkingSpot.status == 'O'  
+    ).first()
+
+    if existing_occupied_reservation:
+        vehicle_number = existing_occupied_reservation.vehicle_number
+        occupied_spot = db.session.get(ParkingSpot, existing_occupied_reservation.spot_id)
+        spot_number = occupied_spot.spot_number if occupied_spot else "Unknown"
+
+        return None, ({
+            'success': False,
+            'conflict_data': {
+                'prime_location_name': existing_occupied_reservation.location_name,
+                'spot_number': spot_number,
+                'vehicle_number': vehicle_number,
+                'parking_timestamp': existing_occupied_reservation.parking_timestamp.isoformat()
+            },
+            'message': f'Vehicle {vehicle_number} is already occupied at {existing_occupied_reservation.location_name} - Spot {spot_number}. Please release this spot before booking elsewhere.',
+            'error_type': 'vehicle_occupied_elsewhere'
+        }, 400)
+
+    return user, None
+
+def new_reservation(user, spot, vehicle_number, points_to_redeem):
+    # ``spot`` has already been claimed (A -> B) in this transaction.
+    return Reservation(
+        user_id=user.id,
+        user_name=user.username,
+        spot_id=spot.id,
+        lot_id=spot.lot_id,
+        prime_location_name=spot.lot.prime_location_name,
+        vehicle_number=vehicle_number,
+        booking_timestamp=datetime.utcnow() + timedelta(hours=5, minutes=30),
+        booking_status='booked',
+        parking_timestamp=datetime.utcnow() + timedelta(hours=5, minutes=30),
+        loyalty_points_redeemed=points_to_redeem  # Store redeemed points for later discount calculation
+    )
+
+def invalidate_bookings(user_id, lot_ids):
+    for lot_id in set(lot_ids):
+        invalidate_parking_cache(lot_id)
+    invalidate_parking_cache()
+    invalidate_user_cache(user_id)
+    invalidate_admin_cache()
+    for lot_id in set(lot_ids):
+        schedule_warm(Mutations.BOOK, lot_id)
+
+def create_booking(user, spot, vehicle_number, points_to_redeem):
+    reservation = new_reservation(user, spot, vehicle_number, points_to_redeem)
+    if points_to_redeem > 0:
+        user.loyalty_points = (user.loyalty_points or 0) - points_to_redeem
+
+    db.session.add(reservation)
+    db.session.commit()
+
+    invalidate_bookings(user.id, [spot.lot_id])
+    discount_amount = points_to_redeem * 0.1  
+
+    return {
+        'success': True,
+        'message': 'Parking spot booked successfully! You have 12 hours to occupy the spot.',
+        'booking_id': reservation.id,
+        'spot_id': spot.id,
+        'spot_number': spot.spot_number,
+        'booking_expires_at': (reservation.booking_timestamp + timedelta(hours=12)).isoformat(),
+        'points_redeemed': points_to_redeem,
+        'discount_applied': discount_amount,
+        'remaining_points': user.loyalty_points
+    }, 201
+
 class UserBookSpotResource(Resource):
     @auth_required
     def post(self):
@@ -428,75 +540,137 @@ class UserBookSpotResource(Resource):
         if spot.status != 'A':
             return {'success': False, 'message': 'Parking spot is not available'}, 400
 
-        user = db.session.get(User, current_user_id)
-        if not user:
-            return {'success': False, 'message': 'User not found'}, 404
+        user, error = check_booking(current_user_id, [vehicle_number], points_to_redeem)
+        if error:
+            return error
 
-        if points_to_redeem > 0 and (user.loyalty_points or 0) < points_to_redeem:
-            return {'success': False, 'message': 'Insufficient loyalty points'}, 400
+        try:
+            # Claim the spot before anything else is written: of two requests
+            # racing for it, only one UPDATE still finds it available.
+            if not compare_and_set(spot, {'status': 'A'}, status='B'):
+                db.session.rollback()
+                return {'success': False, 'message': 'Parking spot is not available'}, 409
 
-        existing_occupied_reservation = Reservation.query.filter_by(
-            vehicle_number=vehicle_number,
-            leaving_timestamp=None 
-        ).join(ParkingSpot).filter(
-            ParkingSpot.status == 'O'  
-        ).first()
+            return create_booking(user, spot, vehicle_number, points_to_redeem)
 
-        if existing_occupied_reservation:
-            occupied_spot = db.session.get(ParkingSpot, existing_occupied_reservation.spot_id)
-            spot_number = occupied_spot.spot_number if occupied_spot else "Unknown"
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'message': f'Error booking spot: {str(e)}'}, 500
 
-            return {
-                'success': False,
-                'conflict_data': {
-                    'prime_location_name': existing_occupied_reservation.prime_location_name,
-                    'spot_number': spot_number,
-                    'vehicle_number': vehicle_number,
-                    'parking_timestamp': existing_occupied_reservation.parking_timestamp.isoformat()
-                },
-                'message': f'Vehicle {vehicle_number} is already occupied at {existing_occupied_reservation.prime_location_name} - Spot {spot_number}. Please release this spot before booking elsewhere.',
-                'error_type': 'vehicle_occupied_elsewhere'
-            }, 400
+class UserBookAnySpotResource(Resource):
+    @auth_required
+    def post(self, lot_id):
+        current_user_id = request.current_user_id
+        data = request.json
+        if not data or not data.get('vehicle_number'):
+            return {'success': False, 'message': 'Vehicle number is required'}, 400
+
+        if data.get('vehicle_type') not in (None,) + VEHICLE_TYPES:
+            return {'success': False, 'message': f'Vehicle type must be one of: {", ".join(VEHICLE_TYPES)}'}, 400
+
+        vehicle_number = data['vehicle_number']
+        points_to_redeem = data.get('points_to_redeem', 0)
+        if not db.session.get(ParkingLot, lot_id):
+            return {'success': False, 'message': 'Parking lot not found'}, 404
+
+        user, error = check_booking(current_user_id, [vehicle_number], points_to_redeem)
+        if error:
+            return error
 
         try:
-            reservation = Reservation(
-                user_id=current_user_id,
-                user_name=user.username,
-                spot_id=spot_id,
-                prime_location_name=spot.lot.prime_location_name,
-                vehicle_number=vehicle_number,
-                booking_timestamp=datetime.utcnow() + timedelta(hours=5, minutes=30),
-                booking_status='booked',
-                parking_timestamp=datetime.utcnow() + timedelta(hours=5, minutes=30),
-                loyalty_points_redeemed=points_to_redeem  # Store redeemed points for later discount calculation
-            )
+            spot = allocate_spot(lot_id, data.get('vehicle_type'))
+            if not spot:
+                db.session.rollback()
+                return {'success': False, 'message': 'No spots available in this parking lot'}, 409
+
+            return create_booking(user, spot, vehicle_number, points_to_redeem)
+
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'message': f'Error booking spot: {str(e)}'}, 500
+
+class UserBatchBookResource(Resource):
+    @auth_required
+    def post(self):
+        current_user_id = request.current_user_id
+        data = request.json or {}
+        vehicles = data.get('vehicles') or []
+        if not isinstance(vehicles, list) or not vehicles:
+            return {'success': False, 'message': 'A list of vehicles is required'}, 400
+
+        if len(vehicles) > MAX_BATCH_BOOKING:
+            return {'success': False, 'message': f'At most {MAX_BATCH_BOOKING} vehicles can be booked at once'}, 400
+
+        vehicles = [{'vehicle_number': vehicle} if isinstance(vehicle, str) else vehicle for vehicle in vehicles]
+        if not all(isinstance(vehicle, dict) for vehicle in vehicles):
+            return {'success': False, 'message': 'Each vehicle must be a vehicle number or an object with one'}, 400
+
+        vehicle_numbers = [vehicle.get('vehicle_number') for vehicle in vehicles]
+        if not all(vehicle_number and isinstance(vehicle_number, str) for vehicle_number in vehicle_numbers):
+            return {'success': False, 'message': 'Every vehicle needs a vehicle number'}, 400
+
+        if any(vehicle.get('vehicle_type') not in (None,) + VEHICLE_TYPES for vehicle in vehicles):
+            return {'success': False, 'message': f'Vehicle type must be one of: {", ".join(VEHICLE_TYPES)}'}, 400
+
+        if len(set(vehicle_numbers)) != len(vehicle_numbers):
+            return {'success': False, 'message': 'Each vehicle can only be booked once per batch'}, 400
+
+        lot_id = data.get('lot_id')
+        if lot_id is not None and (isinstance(lot_id, bool) or not isinstance(lot_id, int)):
+            return {'success': False, 'message': 'Parking lot id must be an integer'}, 400
+
+        points_to_redeem = data.get('points_to_redeem', 0)
+        if lot_id is not None and not db.session.get(ParkingLot, lot_id):
+            return {'success': False, 'message': 'Parking lot not found'}, 404
+
+        user, error = check_booking(current_user_id, vehicle_numbers, points_to_redeem)
+        if error:
+            return error
 
-            spot.status = 'B'
+        try:
+            spots = allocate_spots([vehicle.get('vehicle_type') for vehicle in vehicles], lot_id,
+                                   bool(data.get('contiguous')))
+            if spots is None:
+                db.session.rollback()
+                return {'success': False, 'message': 'Not enough free spots for the whole batch. Nothing was booked.'}, 409
+
+            # Redeemed points are taken once and discounted from the first
+            # booking when it is released.
+            reservations = [
+                new_reservation(user, spot, vehicle_number, points_to_redeem if i == 0 else 0)
+                for i, (spot, vehicle_number) in enumerate(zip(spots, vehicle_numbers))
+            ]
             if points_to_redeem > 0:
                 user.loyalty_points = (user.loyalty_points or 0) - points_to_redeem
 
-            db.session.add(reservation)
-            db.session.commit()
-
-            invalidate_parking_cache(spot.lot_id)
-            invalidate_parking_cache()
-            invalidate_user_cache(current_user_id)
-            invalidate_admin_cache()
-            discount_amount = points_to_redeem * 0.1  
+            db.session.add_all(reservations)
+            db.session.flush()
 
-            return {
+            # Built before the commit expires them, so no per-row reloads.
+            result = {
                 'success': True,
-                'message': 'Parking spot booked successfully! You have 12 hours to occupy the spot.',
-                'booking_id': reservation.id,
-                'booking_expires_at': (reservation.booking_timestamp + timedelta(hours=12)).isoformat(),
+                'message': f'{len(reservations)} parking spots booked successfully! You have 12 hours to occupy them.',
+                'bookings': [{
+                    'booking_id': reservation.id,
+                    'vehicle_number': reservation.vehicle_number,
+                    'lot_id': spot.lot_id,
+                    'prime_location_name': reservation.prime_location_name,
+                    'spot_id': spot.id,
+                    'spot_number': spot.spot_number
+                } for reservation, spot in zip(reservations, spots)],
+                'booking_expires_at': (reservations[0].booking_timestamp + timedelta(hours=12)).isoformat(),
                 'points_redeemed': points_to_redeem,
-                'discount_applied': discount_amount,
+                'discount_applied': points_to_redeem * 0.1,
                 'remaining_points': user.loyalty_points
-            }, 201
+            }
+            db.session.commit()
+
+            invalidate_bookings(current_user_id, [spot.lot_id for spot in spots])
+            return result, 201
 
         except Exception as e:
             db.session.rollback()
-            return {'success': False, 'message': f'Error booking spot: {str(e)}'}, 500
+            return {'success': False, 'message': f'Error booking spots: {str(e)}'}, 500
 
 class UserCancelBookingResource(Resource):
     @auth_required
@@ -516,13 +690,17 @@ class UserCancelBookingResource(Resource):
                 return {'success': False, 'message': 'Booking not found or already processed'}, 404
             
             spot = db.session.get(ParkingSpot, booking.spot_id)
-            if spot:
-                spot.status = 'A'
-                invalidate_parking_cache(spot.lot_id)
+            if spot and not compare_and_set(spot, {'status': 'B'}, status='A'):
+                db.session.rollback()
+                return {'success': False, 'message': 'Booking not found or already processed'}, 409
             
             db.session.delete(booking)
             db.session.commit()
+            if spot:
+                invalidate_parking_cache(spot.lot_id)
+            invalidate_parking_cache()
             invalidate_user_cache(request.current_user_id)
+            schedule_warm(Mutations.CANCEL, spot.lot_id if spot else None)
             
             return {
                 'success': True,
@@ -556,21 +734,30 @@ class UserOccupySpotResource(Resource):
 
         if current_time > booking_expiry:
             spot = db.session.get(ParkingSpot, reservation.spot_id)
-            if spot:
-                spot.status = 'A'
+            if spot and not compare_and_set(spot, {'status': 'B'}, status='A'):
+                db.session.rollback()
+                return {'success': False, 'message': 'Booking not found or already processed'}, 409
 
             db.session.delete(reservation)
             db.session.commit()
+
+            invalidate_parking_cache(spot.lot_id if spot else None)
+            invalidate_parking_cache()
+            invalidate_user_cache(current_user_id)
+            invalidate_admin_cache()
+            schedule_warm(Mutations.EXPIRE, spot.lot_id if spot else None)
             return {'success': False, 'message': 'Booking has expired (12 hours). The spot has been released.'}, 400
 
         try:
-            reservation.booking_status = 'occupied'
-            reservation.occupancy_timestamp = current_time
-            reservation.parking_timestamp = current_time 
+            if not compare_and_set(reservation, {'booking_status': 'booked'}, booking_status='occupied',
+                                   occupancy_timestamp=current_time, parking_timestamp=current_time):
+                db.session.rollback()
+                return {'success': False, 'message': 'Booking not found or already processed'}, 409
 
             spot = db.session.get(ParkingSpot, reservation.spot_id)
-            if spot:
-                spot.status = 'O'
+            if spot and not compare_and_set(spot, {'status': 'B'}, status='O'):
+                db.session.rollback()
+                return {'success': False, 'message': 'Parking spot is no longer held for this booking'}, 409
 
             db.session.commit()
 
@@ -578,6 +765,7 @@ class UserOccupySpotResource(Resource):
             invalidate_parking_cache()
             invalidate_user_cache(current_user_id)
             invalidate_admin_cache()
+            schedule_warm(Mutations.OCCUPY, spot.lot_id if spot else None)
 
             return {
                 'success': True,
@@ -594,52 +782,68 @@ class UserOccupySpotResource(Resource):
 class UserBookingHistoryResource(Resource):
     @auth_required
     def get(self):
+        try:
+            page = PageRequest.from_args(request.args, RESERVATION_FILTERS)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
+
         try:
             current_user_id = request.current_user_id
             cache_key = CacheKeys.user_history(current_user_id)
+            if page:
+                result = cache_manager.get_or_compute(
+                    CacheKeys.page(cache_key, page.digest()), lambda: self._page(current_user_id, page),
+                    CacheTTL.USER_HISTORY, tags=[CacheTags.user(current_user_id)])
+                return {'success': True, 'history': result['items'], 'next_cursor': result['next_cursor']}
+
             cached_history = cache_manager.get(cache_key)
             if cached_history:
                 return {'success': True, 'history': cached_history}
             
-            reservations = Reservation.query.filter_by(user_id=current_user_id).order_by(
-                Reservation.booking_timestamp.desc(),
-                Reservation.parking_timestamp.desc()).all()
+            reservations = Reservation.query.filter_by(user_id=current_user_id).options(
+                joinedload(Reservation.lot)).order_by(*RESERVATION_ORDER).all()
             
-            history = []
-            for reservation in reservations:
-                spot_number = reservation.spot.spot_number if reservation.spot else 'N/A'
-                booking_time_str = reservation.booking_timestamp.strftime("%Y-%m-%d %H:%M:%S") if reservation.booking_timestamp else 'N/A'
-                end_time_str = 'N/A'
-                cost = 0
-                breakdown = 'No cost calculated'
-                
-                if reservation.leaving_timestamp:
-                    end_time_str = reservation.leaving_timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                    cost = reservation.parking_cost or 0
-                    if reservation.parking_timestamp:
-                        duration = reservation.leaving_timestamp - reservation.parking_timestamp
-                        hours = duration.total_seconds() / 3600
-                        breakdown = f"{hours:.1f} hours × rate"
-                
-                booking_status = self._get_user_status_description(reservation)
-                history.append({
-                    'id': reservation.id,
-                    'location': reservation.prime_location_name,
-                    'spot_number': spot_number,
-                    'vehicle_number': reservation.vehicle_number,
-                    'booking_timestamp': booking_time_str,
-                    'booking_status': booking_status,
-                    'start_time': reservation.parking_timestamp.strftime("%Y-%m-%d %H:%M:%S") if reservation.parking_timestamp else None,
-                    'end_time': end_time_str,
-                    'cost': cost,
-                    'cost_breakdown': breakdown
-                })
-            cache_manager.set(cache_key, history, CacheTTL.USER_HISTORY)
+            history = [self._history_item(reservation) for reservation in reservations]
+            cache_manager.set(cache_key, history, CacheTTL.USER_HISTORY, tags=[CacheTags.user(current_user_id)])
             return {'success': True, 'history': history}
             
         except Exception as e:
             return {'success': False, 'message': f'Error fetching booking history: {str(e)}'}, 500
 
+    def _page(self, current_user_id, page):
+        query = Reservation.query.filter_by(user_id=current_user_id).options(joinedload(Reservation.spot), joinedload(Reservation.lot))
+        rows, next_cursor = page.fetch(query, RESERVATION_FILTERS, Reservation.booking_timestamp,
+                                       Reservation.id, reservation_key)
+        return {'items': [self._history_item(reservation) for reservation in rows], 'next_cursor': next_cursor}
+
+    def _history_item(self, reservation):
+        spot_number = reservation.spot.spot_number if reservation.spot else 'N/A'
+        booking_time_str = reservation.booking_timestamp.strftime("%Y-%m-%d %H:%M:%S") if reservation.booking_timestamp else 'N/A'
+        end_time_str = 'N/A'
+        cost = 0
+        breakdown = 'No cost calculated'
+        
+        if reservation.leaving_timestamp:
+            end_time_str = reservation.leaving_timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            cost = reservation.parking_cost or 0
+            if reservation.parking_timestamp:
+                duration = reservation.leaving_timestamp - reservation.parking_timestamp
+                hours = duration.total_seconds() / 3600
+                breakdown = f"{hours:.1f} hours × rate"
+        
+        return {
+            'id': reservation.id,
+            'location': reservation.location_name,
+            'spot_number': spot_number,
+            'vehicle_number': reservation.vehicle_number,
+            'booking_timestamp': booking_time_str,
+            'booking_status': self._get_user_status_description(reservation),
+            'start_time': reservation.parking_timestamp.strftime("%Y-%m-%d %H:%M:%S") if reservation.parking_timestamp else None,
+            'end_time': end_time_str,
+            'cost': cost,
+            'cost_breakdown': breakdown
+        }
+
     def _get_user_status_description(self, reservation):
         status = reservation.booking_status or 'occupied' 
         
@@ -685,12 +889,13 @@ class UserReleaseSpotResource(Resource):
                     return jsonify({'success': False, 'message': 'Spot already released'}), 400
 
                 now = datetime.utcnow() + timedelta(hours=5, minutes=30)
-                reservation.leaving_timestamp = now
+                if not compare_and_set(reservation, {'leaving_timestamp': None}, leaving_timestamp=now):
+                    db.session.rollback()
+                    return jsonify({'success': False, 'message': 'Spot already released'}), 400
+
                 duration = now - reservation.parking_timestamp
                 duration_hours = duration.total_seconds() / 3600
-                # Case-insensitive lookup for parking lot
-                lot = ParkingLot.query.filter(
-                    db.func.lower(ParkingLot.prime_location_name) == reservation.prime_location_name.lower()).first()
+                lot = reservation.lot
                 hourly_rate = lot.price_per_hour if lot else 5.0
                 total_cost = round(duration_hours * hourly_rate, 2)
 
@@ -708,8 +913,9 @@ class UserReleaseSpotResource(Resource):
                     user.loyalty_points = (user.loyalty_points or 0) + points_earned
 
                 spot = db.session.get(ParkingSpot, reservation.spot_id)
-                if spot:
-                    spot.status = 'A'
+                if spot and not compare_and_set(spot, {'status': ('O', 'B')}, status='A'):
+                    db.session.rollback()
+                    return jsonify({'success': False, 'message': 'Spot already released'}), 409
 
                 db.session.commit()
 
@@ -719,6 +925,7 @@ class UserReleaseSpotResource(Resource):
                 invalidate_parking_cache() 
                 invalidate_user_cache(current_user_id)
                 invalidate_admin_cache() 
+                schedule_warm(Mutations.RELEASE, spot.lot_id if spot else None)
 
                 if spot:
                     cache_manager.delete(f"spot:{spot.id}")
@@ -728,7 +935,7 @@ class UserReleaseSpotResource(Resource):
                 duration_minutes_display = int((duration_hours % 1) * 60)
                 duration_str = f"{duration_hours_display}h {duration_minutes_display}m"
                 release_details = {
-                    'prime_location_name': reservation.prime_location_name,
+                    'prime_location_name': reservation.location_name,
                     'spot_number': spot.spot_number if spot else 'N/A',
                     'duration': duration_str,
                     'total_cost': total_cost,
@@ -791,33 +998,9 @@ class AdminSendMonthlyReportsResource(Resource):
 
 class AdminParkingLotsResource(Resource):
     @admin_required
+    @conditional(lambda: [CacheTags.PARKING, CacheTags.ADMIN])
     def get(self):
-        cache_key = "admin:parking:lots:all"
-        cached_lots = cache_manager.get(cache_key)
-        if cached_lots:
-            return {'success': True, 'parking_lots': cached_lots}
-
-        lots = ParkingLot.query.all()
-        data = []
-        for lot in lots:
-            total_spots = ParkingSpot.query.filter_by(lot_id=lot.id).count()
-            available_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-            occupied_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='O').count()
-            maintenance_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='M').count()
-
-            data.append({
-                'id': lot.id,
-                'name': lot.prime_location_name,
-                'address': lot.address,  
-                'pin_code': lot.pin_code, 
-                'capacity': total_spots,  
-                'available': available_spots, 
-                'occupied': occupied_spots,  
-                'maintenance': maintenance_spots,
-                'price_per_hour': lot.price_per_hour,
-                'created_at': lot.created_at.isoformat() if lot.created_at else None
-            })
-        cache_manager.set(cache_key, data, CacheTTL.PARKING_AVAILABILITY)
+        data = read_family('admin_parking_lots')
         return {'success': True, 'parking_lots': data}
 
     @admin_required
@@ -859,6 +1042,7 @@ class AdminParkingLotsResource(Resource):
 
             invalidate_parking_cache()
             invalidate_admin_cache()
+            schedule_warm(Mutations.LOT_CREATE)
             return {'success': True, 'message': 'Parking lot created successfully'}, 201
 
         except Exception as e:
@@ -883,24 +1067,13 @@ class AdminParkingLotResource(Resource):
                     'message': f'Cannot delete parking lot: {active_reservations} active reservations found. Please wait for users to release their spots.'
                 }, 400
 
-            spots = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-            spot_ids = [spot.id for spot in spots]
-            if spot_ids:
-                Reservation.query.filter(
-                    Reservation.spot_id.in_(spot_ids),
-                    Reservation.leaving_timestamp.is_not(None) 
-                ).delete(synchronize_session=False)
-                MaintenanceRequest.query.filter(MaintenanceRequest.spot_id.in_(spot_ids)).delete(synchronize_session=False)
-
-            for spot in spots:
-                db.session.delete(spot)
-
-            db.session.delete(lot)
+            delete_lot(lot)
             db.session.commit()
 
             invalidate_parking_cache()
             invalidate_admin_cache()
-            cache_manager.delete("user:parking:lots:all")
+            cache_manager.delete(CacheKeys.user_parking_lots())
+            schedule_warm(Mutations.LOT_DELETE)
 
             return {'success': True, 'message': 'Parking lot and all its spots deleted successfully.'}
 
@@ -914,64 +1087,16 @@ class AdminParkingRecordsResource(Resource):
     @admin_required
     def get(self):
         try:
-            cache_key = "admin:parking:records:all"
-            cached_records = cache_manager.get(cache_key)
-
-            if cached_records:
-                return {'success': True, 'records': cached_records}
+            page = PageRequest.from_args(request.args, RESERVATION_FILTERS)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
 
-            reservations = Reservation.query.order_by(
-                Reservation.booking_timestamp.desc(),
-                Reservation.parking_timestamp.desc()).all()
+        try:
+            if page:
+                result = read_family_page('admin_parking_records', page)
+                return {'success': True, 'records': result['items'], 'next_cursor': result['next_cursor']}
 
-            data = []
-            for reservation in reservations:
-                try:
-                    user = db.session.get(User, reservation.user_id)
-                    user_name = user.username if user else reservation.user_name or 'Unknown'
-                    spot = db.session.get(ParkingSpot, reservation.spot_id)
-                    spot_number = spot.spot_number if spot else 'Unknown'
-                    duration_hours = None
-                    if reservation.parking_timestamp and reservation.leaving_timestamp:
-                        duration = reservation.leaving_timestamp - reservation.parking_timestamp
-                        duration_hours = round(duration.total_seconds() / 3600, 2)
-
-                    status_display = reservation.booking_status or 'completed'
-                    if reservation.booking_status in ['cancelled', 'auto_cancelled']:
-                        status_display = 'Cancelled'
-
-                    elif reservation.leaving_timestamp:
-                        status_display = 'Completed'
-                    elif reservation.booking_status == 'occupied':
-                        status_display = 'Active'
-
-                    elif reservation.booking_status == 'booked':
-                        status_display = 'Booked'
-
-                    record = {
-                        'id': reservation.id,
-                        'user_name': user_name,
-                        'prime_location_name': reservation.prime_location_name or 'Unknown',
-                        'spot_number': spot_number,
-                        'vehicle_number': reservation.vehicle_number or 'N/A',
-                        'start_time': reservation.parking_timestamp.isoformat() if reservation.parking_timestamp else None,
-                        'end_time': reservation.leaving_timestamp.isoformat() if reservation.leaving_timestamp else None,
-                        'cost': float(reservation.parking_cost) if reservation.parking_cost else 0.0,
-                        'duration_hours': duration_hours,
-                        'booking_status': status_display,
-                        'booking_timestamp': reservation.booking_timestamp.isoformat() if reservation.booking_timestamp else None,
-                        'occupancy_timestamp': reservation.occupancy_timestamp.isoformat() if reservation.occupancy_timestamp else None
-                    }
-                    
-                    data.append(record)
-                    
-                except Exception as record_error:
-                    print(f"Error processing reservation {reservation.id}: {str(record_error)}")
-                    continue
-
-            cache_manager.set(cache_key, data, CacheTTL.PARKING_AVAILABILITY)
-
-            return {'success': True, 'records': data}
+            return stream_list('records', stream_admin_parking_records())
 
         except Exception as e:
             print(f"Error in get_admin_parking_records: {str(e)}")
@@ -983,34 +1108,16 @@ class AdminFeedbackResource(Resource):
     @admin_required
     def get(self):
         try:
-            cache_key = "admin:feedback:all"
-            cached_feedback = cache_manager.get(cache_key)
-            if cached_feedback:
-                return {'success': True, 'feedback': cached_feedback}
+            page = PageRequest.from_args(request.args, FEEDBACK_FILTERS)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
 
-            feedback_list = UserFeedback.query.order_by(UserFeedback.submitted_at.desc()).all()
-            data = []
-
-            for feedback in feedback_list:
-                data.append({
-                    'id': feedback.id,
-                    'user_id': feedback.user_id,
-                    'user_name': feedback.user_name,
-                    'user_email': feedback.user_email,
-                    'user_phone': feedback.user_phone,
-                    'parking_lot_name': feedback.parking_lot_name,
-                    'spot_number': feedback.spot_number,
-                    'issue_category': feedback.issue_category,
-                    'description': feedback.description,
-                    'status': feedback.status,
-                    'admin_response': feedback.admin_response,
-                    'submitted_at': feedback.submitted_at.isoformat() if feedback.submitted_at else None,
-                    'updated_at': feedback.updated_at.isoformat() if feedback.updated_at else None
-                })
-
-            cache_manager.set(cache_key, data, CacheTTL.ADMIN_FEEDBACK)
+        try:
+            if page:
+                result = read_family_page('admin_feedback', page)
+                return {'success': True, 'feedback': result['items'], 'next_cursor': result['next_cursor']}
 
-            return {'success': True, 'feedback': data}
+            return stream_list('feedback', stream_admin_feedback())
 
         except Exception as e:
             return {'success': False, 'message': f'Error loading feedback: {str(e)}'}, 500
@@ -1036,7 +1143,7 @@ class AdminFeedbackResource(Resource):
 
             feedback.updated_at = datetime.utcnow() + timedelta(hours=5, minutes=30)
             db.session.commit()
-            cache_manager.delete("admin:feedback:all")
+            schedule_warm(Mutations.FEEDBACK)
             return {'success': True, 'message': 'Feedback updated successfully'}
 
         except Exception as e:
@@ -1054,6 +1161,7 @@ class AdminToggleMaintenanceResource(Resource):
             spot.is_under_maintenance = not spot.is_under_maintenance
             db.session.commit()
             invalidate_parking_cache()
+            schedule_warm(Mutations.MAINTENANCE, spot.lot_id)
             status = "under maintenance" if spot.is_under_maintenance else "available"
             return {
                 'success': True,
@@ -1083,6 +1191,7 @@ class AdminToggleSpotTypeResource(Resource):
             db.session.commit()
 
             invalidate_parking_cache(spot.lot_id)
+            schedule_warm(Mutations.SPOT_TYPE, spot.lot_id)
                 
             return jsonify({
             'success': True,
@@ -1138,6 +1247,7 @@ class AdminCreateParkingLotResource(Resource):
             db.session.commit()
             invalidate_parking_cache()
             invalidate_admin_cache()
+            schedule_warm(Mutations.LOT_CREATE)
             
             return {
                 'success': True,
@@ -1219,10 +1329,6 @@ class AdminEditParkingLotResource(Resource):
             lot.price_per_hour = price
             lot.address = address
             lot.pin_code = pincode
-            if name_changed:
-                reservations_to_update = Reservation.query.filter_by(prime_location_name=old_name).all()
-                for reservation in reservations_to_update:
-                    reservation.prime_location_name = name
 
             current_spots = ParkingSpot.query.filter_by(lot_id=lot_id).count()
             if capacity > current_spots:
@@ -1264,37 +1370,33 @@ class AdminEditParkingLotResource(Resource):
                         'message': f'Cannot reduce capacity to {capacity}. Currently {booked_occupied_count} spots are booked or occupied. Minimum capacity allowed: {booked_occupied_count}'
                     }), 400
 
-                available_spots = ParkingSpot.query.filter_by(
-                    lot_id=lot_id,
-                    status='A'
-                ).order_by(ParkingSpot.id.desc()).all()
-
-                spots_to_remove = []
-                for spot in available_spots:
-                    has_reservations = Reservation.query.filter_by(spot_id=spot.id).first() is not None
-                    if not has_reservations:
-                        spots_to_remove.append(spot)
-                        if len(spots_to_remove) >= (current_spots - capacity):
-                            break
+                # Any spot without an open booking can go; its history stays.
+                open_booking = Reservation.query.filter(
+                    Reservation.spot_id == ParkingSpot.id,
+                    Reservation.leaving_timestamp.is_(None)).exists()
+                spots_to_remove = ParkingSpot.query.filter(
+                    ParkingSpot.lot_id == lot_id,
+                    ParkingSpot.status.not_in(['B', 'O']),
+                    ~open_booking
+                ).order_by(ParkingSpot.id.desc()).limit(current_spots - capacity).all()
 
                 if len(spots_to_remove) < (current_spots - capacity):
-                    for spot in available_spots:
-                        if spot not in spots_to_remove:
-                            spots_to_remove.append(spot)
-                            if len(spots_to_remove) >= (current_spots - capacity):
-                                break
+                    return jsonify({
+                        'success': False,
+                        'message': f'Cannot reduce capacity to {capacity}. Only {len(spots_to_remove)} spots are free of open bookings.'
+                    }), 400
 
-                for spot in spots_to_remove:
-                    db.session.delete(spot)
+                delete_spots(spots_to_remove)
 
             lot.total_number_of_spots = capacity
             db.session.commit()
             invalidate_parking_cache(lot_id)  
             invalidate_parking_cache() 
             invalidate_admin_cache() 
+            schedule_warm(Mutations.LOT_EDIT, lot_id)
 
             if name_changed:
-                affected_users = db.session.query(Reservation.user_id).filter_by(prime_location_name=name).distinct().all()
+                affected_users = db.session.query(Reservation.user_id).filter_by(lot_id=lot_id).distinct().all()
                 for user_tuple in affected_users:
                     invalidate_user_cache(user_tuple[0])
 
@@ -1322,12 +1424,12 @@ class AdminDeleteParkingLotResource(Resource):
                     'message': 'Cannot delete parking lot with active reservations'
                 }, 400
             
-            ParkingSpot.query.filter_by(lot_id=lot_id).delete()
-            db.session.delete(lot)
+            delete_lot(lot)
             db.session.commit()
             
             invalidate_parking_cache()
             invalidate_admin_cache()
+            schedule_warm(Mutations.LOT_DELETE)
             
             return {
                 'success': True,
@@ -1342,80 +1444,25 @@ class AdminUsersResource(Resource):
     @admin_required
     def get(self):
         try:
-            cache_key = "admin:users:all"
-            cached_users = cache_manager.get(cache_key)
-            if cached_users:
-                return {'success': True, 'users': cached_users}
-
-            users = User.query.filter(User.role != 'admin').all()
-            data = []
-            for user in users:
-                # Get active reservation info for current spot and location
-                active_res = Reservation.query.filter_by(
-                    user_id=user.id,
-                    leaving_timestamp=None).first()
-
-                data.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'role': user.role or 'user',
-                    'phone_number': user.phone_number,
-                    'loyalty_points': user.loyalty_points or 0,
-                    'profile_created_at': user.profile_created_at.isoformat() if user.profile_created_at else None,
-                    'current_spot': active_res.spot.spot_number if active_res and active_res.spot else None,
-                    'location': active_res.prime_location_name if active_res else None
-                })
+            page = PageRequest.from_args(request.args, USER_FILTERS)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
 
-            cache_manager.set(cache_key, data, CacheTTL.ADMIN_RECORDS)
-            return {'success': True, 'users': data}
+        try:
+            if page:
+                result = read_family_page('admin_users', page)
+                return {'success': True, 'users': result['items'], 'next_cursor': result['next_cursor']}
+
+            return stream_list('users', stream_admin_users())
 
         except Exception as e:
             return {'success': False, 'message': f'Error loading users: {str(e)}'}, 500
 
 class AdminGetSpotsbylotsResource(Resource):
     @admin_required
+    @conditional(lambda lot_id: [CacheTags.PARKING, CacheTags.lot(lot_id)])
     def get(self, lot_id):
-        cache_key = CacheKeys.parking_spots(lot_id)
-        cached_spots = cache_manager.get(cache_key)
-
-        if cached_spots:
-            return jsonify({'success': True, 'spots': cached_spots})
-
-        spots = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-        data = []
-        for spot in spots:
-            reservation = None
-            if spot.status == 'O':
-                reservation = Reservation.query.filter_by(
-                    spot_id=spot.id,
-                    leaving_timestamp=None
-                ).first()
-
-            elif spot.status == 'B':
-                reservation = Reservation.query.filter_by(
-                    spot_id=spot.id,
-                    booking_status='booked',
-                    leaving_timestamp=None
-                ).first()
-
-            data.append({
-                'id': spot.id,
-                'spot_number': spot.spot_number,
-                'status': spot.status,
-                'vehicle_type': spot.vehicle_type_supported,
-                'is_occupied': spot.status == 'O',
-                'is_booked': spot.status == 'B',
-                'is_maintenance': spot.is_under_maintenance,
-                'maintenance_reason': spot.maintenance_reason,
-                'maintenance_started_at': spot.maintenance_started_at.isoformat() if spot.maintenance_started_at else None,
-                'vehicle_number': reservation.vehicle_number if reservation else None,
-                'user_name': reservation.user_name if reservation else None,
-                'parking_timestamp': reservation.parking_timestamp.isoformat() if reservation and reservation.parking_timestamp else None,
-                'booking_timestamp': reservation.booking_timestamp.isoformat() if reservation and reservation.booking_timestamp else None
-            })
-
-        cache_manager.set(cache_key, data, CacheTTL.PARKING_SPOTS)
+        data = admin_spot_view(read_family('spot_grid', lot_id))
         return jsonify({'success': True, 'spots': data})
 
 class UserChangePasswordResource(Resource):
@@ -1501,6 +1548,7 @@ class UserUpdateProfileResource(Resource):
             db.session.commit()
 
             invalidate_user_cache(current_user_id)
+            schedule_warm(Mutations.PROFILE)
 
             return {'success': True, 'message': 'Profile updated successfully','user': {
                 'id': user.id,
@@ -1519,36 +1567,54 @@ class UserUpdateProfileResource(Resource):
 class UserReservationsResource(Resource):
     @auth_required
     def get(self):
+        try:
+            page = PageRequest.from_args(request.args, RESERVATION_FILTERS)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
+
         try:
             current_user_id = request.current_user_id
-            cache_key = f"user:reservations:{current_user_id}"
+            cache_key = CacheKeys.user_reservations(current_user_id)
+            if page:
+                result = cache_manager.get_or_compute(
+                    CacheKeys.page(cache_key, page.digest()), lambda: self._page(current_user_id, page),
+                    CacheTTL.USER_RESERVATIONS, tags=[CacheTags.user(current_user_id)])
+                return {'success': True, 'reservations': result['items'], 'next_cursor': result['next_cursor']}
+
             cached_reservations = cache_manager.get(cache_key)
             if cached_reservations:
                 return {'success': True, 'reservations': cached_reservations}
 
-            reservations = Reservation.query.filter_by(user_id=current_user_id).order_by(Reservation.parking_timestamp.desc()).all()
-            data = []
-
-            for reservation in reservations:
-                data.append({
-                    'id': reservation.id,
-                    'spot_number': reservation.spot.spot_number if reservation.spot else 'Unknown',
-                    'prime_location_name': reservation.prime_location_name,
-                    'vehicle_number': reservation.vehicle_number,
-                    'parking_timestamp': reservation.parking_timestamp.isoformat() if reservation.parking_timestamp else None,
-                    'leaving_timestamp': reservation.leaving_timestamp.isoformat() if reservation.leaving_timestamp else None,
-                    'parking_cost': reservation.parking_cost,
-                    'status': 'Active' if not reservation.leaving_timestamp else 'Completed',
-                    'duration_hours': self._calculate_duration(reservation.parking_timestamp, reservation.leaving_timestamp) if reservation.leaving_timestamp else None
-                })
+            reservations = Reservation.query.filter_by(user_id=current_user_id).options(
+                joinedload(Reservation.lot)).order_by(*RESERVATION_ORDER).all()
+            data = [self._reservation_item(reservation) for reservation in reservations]
 
-            cache_manager.set(cache_key, data, CacheTTL.USER_RESERVATIONS)
+            cache_manager.set(cache_key, data, CacheTTL.USER_RESERVATIONS, tags=[CacheTags.user(current_user_id)])
 
             return {'success': True, 'reservations': data}
 
         except Exception as e:
             return {'success': False, 'message': f'Error loading reservations: {str(e)}'}, 500
 
+    def _page(self, current_user_id, page):
+        query = Reservation.query.filter_by(user_id=current_user_id).options(joinedload(Reservation.spot), joinedload(Reservation.lot))
+        rows, next_cursor = page.fetch(query, RESERVATION_FILTERS, Reservation.booking_timestamp,
+                                       Reservation.id, reservation_key)
+        return {'items': [self._reservation_item(reservation) for reservation in rows], 'next_cursor': next_cursor}
+
+    def _reservation_item(self, reservation):
+        return {
+            'id': reservation.id,
+            'spot_number': reservation.spot.spot_number if reservation.spot else 'Unknown',
+            'prime_location_name': reservation.location_name,
+            'vehicle_number': reservation.vehicle_number,
+            'parking_timestamp': reservation.parking_timestamp.isoformat() if reservation.parking_timestamp else None,
+            'leaving_timestamp': reservation.leaving_timestamp.isoformat() if reservation.leaving_timestamp else None,
+            'parking_cost': reservation.parking_cost,
+            'status': 'Active' if not reservation.leaving_timestamp else 'Completed',
+            'duration_hours': self._calculate_duration(reservation.parking_timestamp, reservation.leaving_timestamp) if reservation.leaving_timestamp else None
+        }
+
     def _calculate_duration(self, start_time, end_time):
         if not start_time or not end_time:
             return None
@@ -1606,6 +1672,7 @@ class AdminUpdateFeedbackResource(Resource):
             
             db.session.commit()
             invalidate_admin_cache()
+            schedule_warm(Mutations.FEEDBACK)
             return {
                 'success': True,
                 'message': 'Feedback updated successfully',
@@ -0,0 +1,703 @@
+import base64
+import json
+import logging
+import uuid
+from collections import defaultdict
+from sqlalchemy import and_, case, event, func, inspect, not_, or_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from .cache_utils import cache_manager, CacheKeys, CacheTTL
+from .models import db, ParkingLot, ParkingSpot
+
+logger = logging.getLogger(__name__)
+
+# Per-lot spot counters in Redis, fed by the session hooks below on commit.
+# A delta for an older build, or one that lands mid-rebuild, drops the hash.
+#
+# They also keep a free-spot set per lot and vehicle type for allocate_spot,
+# and a spot map per lot: one bitmap per layer, one bit per spot by ordinal.
+
+class SpotCounts:
+    AVAILABLE = "available"
+    BOOKED = "booked"
+    OCCUPIED = "occupied"
+    MAINTENANCE = "maintenance"
+    TOTAL = "total"
+    FIELDS = (AVAILABLE, BOOKED, OCCUPIED, MAINTENANCE, TOTAL)
+
+EV = "ev"
+MAP_LAYERS = (SpotCounts.AVAILABLE, SpotCounts.BOOKED, SpotCounts.OCCUPIED, SpotCounts.MAINTENANCE, EV)
+
+# KEYS: (counts hash, building marker) per lot; ARGV per lot: the
+# generation seen at flush, the number of fields n, then n field/delta pairs.
+# n == 0 means the lot is gone.
+APPLY_DELTAS_SCRIPT = """
+local a = 1
+for i = 1, #KEYS, 2 do
+    local counts, building = KEYS[i], KEYS[i + 1]
+    local gen, n = ARGV[a], tonumber(ARGV[a + 1])
+    if n == 0 or redis.call('EXISTS', building) == 1 then
+        redis.call('DEL', counts, building)
+    elseif redis.call('HGET', counts, 'gen') ~= gen then
+        redis.call('DEL', counts)
+    else
+        for j = 1, n do
+            redis.call('HINCRBY', counts, ARGV[a + 2 * j], ARGV[a + 2 * j + 1])
+        end
+    end
+    a = a + 2 + 2 * n
+end
+return #KEYS / 2
+"""
+
+# KEYS: counts hash, generation, building marker; ARGV: the rebuild's token,
+# the TTL, then field/value pairs. Installs nothing if a delta arrived.
+INSTALL_COUNTS_SCRIPT = """
+if redis.call('GET', KEYS[3]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[3])
+local gen = redis.call('INCR', KEYS[2])
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'gen', gen, unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return gen
+"""
+
+# KEYS: the building marker, the ordinals hash, then one bitmap per layer;
+# ARGV: the spot id then its bit in each layer. Cancels a build in progress,
+# and leaves a lot whose map isn't built alone.
+SET_SPOT_BITS_SCRIPT = """
+redis.call('DEL', KEYS[1])
+local ordinal = redis.call('HGET', KEYS[2], ARGV[1])
+if not ordinal then
+    return 0
+end
+for i = 3, #KEYS do
+    redis.call('SETBIT', KEYS[i], ordinal, ARGV[i - 1])
+end
+return 1
+"""
+
+# KEYS: the building marker, layout, ordinals hash, then one bitmap per
+# layer; ARGV: the build's token, the TTL, the layout, one bitmap per layer,
+# then spot id/ordinal pairs. Installs nothing if a bit update arrived.
+INSTALL_SPOT_MAP_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[3])
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[2])
+for i = 4, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[i], 'EX', ARGV[2])
+end
+if #ARGV > #KEYS then
+    for i = #KEYS + 1, #ARGV, 1000 do
+        redis.call('HSET', KEYS[3], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+    end
+    redis.call('EXPIRE', KEYS[3], ARGV[2])
+end
+return 1
+"""
+
+_scripts = {}
+
+def _script(source):
+    # Registered on first use; each call passes the current client.
+    if source not in _scripts:
+        _scripts[source] = cache_manager.redis_client.register_script(source)
+    return _scripts[source]
+
+PENDING = "spot_count_deltas"
+GENERATIONS = "spot_count_generations"
+MAP_PENDING = "spot_map_changes"
+POOL_PENDING = "spot_pool_changes"
+POPPED = "spot_pool_popped"
+POOL_REBUILD = "spot_pool_rebuild"
+DEFAULT_VEHICLE_TYPE = 'non-EV'
+
+def spot_bucket(status, under_maintenance):
+    if under_maintenance or status == 'M':
+        return SpotCounts.MAINTENANCE
+    return {'A': SpotCounts.AVAILABLE, 'B': SpotCounts.BOOKED, 'O': SpotCounts.OCCUPIED}.get(status)
+
+def _before_after(state, attr):
+    history = state.attrs[attr].history
+    unchanged = history.unchanged[0] if history.unchanged else None
+    before = history.deleted[0] if history.deleted else unchanged
+    after = history.added[0] if history.added else unchanged
+    return before, after
+
+def _pending(session):
+    return session.info.setdefault(PENDING, defaultdict(int))
+
+def _capture_generations(session, lot_ids):
+    # Runs before the commit, so a matching generation proves the delta's
+    # write came after the hash was built.
+    generations = session.info.setdefault(GENERATIONS, {})
+    lot_ids = [lot_id for lot_id in set(lot_ids) if lot_id not in generations]
+    if not lot_ids:
+        return
+    values = [None] * len(lot_ids)
+    if cache_manager.is_available():
+        try:
+            values = cache_manager._execute(cache_manager.redis_client.mget,
+                                            [CacheKeys.lot_counts_generation(lot_id) for lot_id in lot_ids])
+        except Exception as e:
+            logger.error(f"Spot counter generation read failed: {e}")
+    for lot_id, value in zip(lot_ids, values):
+        generations[lot_id] = value.decode() if value else ''
+
+def _pool_change(session, lot_id, vehicle_type, spot_id, add):
+    key = CacheKeys.free_spots(lot_id, vehicle_type or DEFAULT_VEHICLE_TYPE)
+    session.info.setdefault(POOL_PENDING, []).append((key, spot_id, add))
+
+def _map_change(session, lot_id, spot=None, bucket=None):
+    # ``spot`` None means the lot's layout changed and its map is dropped.
+    changes = session.info.setdefault(MAP_PENDING, {})
+    if spot is None:
+        changes[lot_id] = None
+    elif changes.setdefault(lot_id, {}) is not None:
+        changes[lot_id][spot.id] = (bucket, spot.vehicle_type_supported)
+
+@event.listens_for(Session, "after_flush")
+def _collect_deltas(session, flush_context):
+    deltas = _pending(session)
+
+    for spot in session.new:
+        if isinstance(spot, ParkingSpot):
+            bucket = spot_bucket(spot.status or 'A', spot.is_under_maintenance)
+            deltas[(spot.lot_id, SpotCounts.TOTAL)] += 1
+            deltas[(spot.lot_id, bucket)] += 1
+            if bucket == SpotCounts.AVAILABLE:
+                _pool_change(session, spot.lot_id, spot.vehicle_type_supported, spot.id, True)
+            _map_change(session, spot.lot_id)
+
+    for spot in session.dirty:
+        if not isinstance(spot, ParkingSpot):
+            continue
+        state = inspect(spot)
+        old_status, new_status = _before_after(state, 'status')
+        old_flag, new_flag = _before_after(state, 'is_under_maintenance')
+        old_type, new_type = _before_after(state, 'vehicle_type_supported')
+        old_bucket, new_bucket = spot_bucket(old_status, old_flag), spot_bucket(new_status, new_flag)
+        if old_bucket != new_bucket:
+            deltas[(spot.lot_id, old_bucket)] -= 1
+            deltas[(spot.lot_id, new_bucket)] += 1
+        if (old_bucket, old_type) != (new_bucket, new_type):
+            if old_bucket == SpotCounts.AVAILABLE:
+                _pool_change(session, spot.lot_id, old_type, spot.id, False)
+            if new_bucket == SpotCounts.AVAILABLE:
+                _pool_change(session, spot.lot_id, new_type, spot.id, True)
+            _map_change(session, spot.lot_id, spot, new_bucket)
+        if state.attrs['spot_number'].history.has_changes():
+            _map_change(session, spot.lot_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, ParkingSpot):
+            state = inspect(obj)
+            bucket = spot_bucket(_before_after(state, 'status')[0], _before_after(state, 'is_under_maintenance')[0])
+            deltas[(obj.lot_id, SpotCounts.TOTAL)] -= 1
+            deltas[(obj.lot_id, bucket)] -= 1
+            if bucket == SpotCounts.AVAILABLE:
+                _pool_change(session, obj.lot_id, _before_after(state, 'vehicle_type_supported')[0], obj.id, False)
+            _map_change(session, obj.lot_id)
+        elif isinstance(obj, ParkingLot):
+            deltas[(obj.id, None)] = 0
+            _map_change(session, obj.id)
+
+    _capture_generations(session, [lot_id for lot_id, _ in deltas])
+
+@event.listens_for(Session, "after_commit")
+def _apply_deltas(session):
+    session.info.pop(POPPED, None)
+    deltas = session.info.pop(PENDING, None)
+    generations = session.info.pop(GENERATIONS, {})
+    if deltas:
+        apply_deltas(deltas, generations)
+    changes = session.info.pop(POOL_PENDING, None)
+    if changes:
+        apply_pool_changes(changes)
+    map_changes = session.info.pop(MAP_PENDING, None)
+    if map_changes:
+        apply_map_changes(map_changes)
+    stale_pools = session.info.pop(POOL_REBUILD, None)
+    if stale_pools:
+        # The committed session can't emit SQL; reseed from a fresh one.
+        try:
+            with Session(db.engine) as reader:
+                rebuild_free_spots(sorted(stale_pools), session=reader)
+        except Exception as e:
+            logger.error(f"Free spot pool rebuild failed: {e}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_deltas(session):
+    session.info.pop(PENDING, None)
+    session.info.pop(GENERATIONS, None)
+    session.info.pop(POOL_PENDING, None)
+    session.info.pop(MAP_PENDING, None)
+    session.info.pop(POOL_REBUILD, None)
+    # A spot popped for a booking that never committed is still free.
+    popped = session.info.pop(POPPED, None)
+    if popped:
+        apply_pool_changes([(key, spot_id, True) for key, spot_id in popped])
+
+def apply_deltas(deltas, generations):
+    by_lot = defaultdict(dict)
+    for (lot_id, field), delta in deltas.items():
+        if field is None:
+            by_lot[lot_id] = None
+        elif delta and by_lot[lot_id] is not None:
+            by_lot[lot_id][field] = delta
+
+    keys, args = [], []
+    for lot_id, fields in by_lot.items():
+        if fields == {}:
+            continue
+        keys.extend([CacheKeys.lot_counts(lot_id), CacheKeys.lot_counts_building(lot_id)])
+        args.extend([generations.get(lot_id, ''), len(fields or {})])
+        for field, delta in (fields or {}).items():
+            args.extend([field, delta])
+
+    if not keys or not cache_manager.is_available():
+        return
+    try:
+        cache_manager._execute(_script(APPLY_DELTAS_SCRIPT), keys=keys, args=args,
+                               client=cache_manager.redis_client)
+    except Exception as e:
+        # The hashes are now behind the DB; drop them so the next read rebuilds.
+        logger.error(f"Spot counter update failed: {e}")
+        try:
+            cache_manager._execute(cache_manager.redis_client.delete, *keys)
+        except Exception:
+            pass
+
+def _conditional_update(model, row_id, expected, values, returning=()):
+    conditions = [model.id == row_id]
+    for name, value in expected.items():
+        column = getattr(model, name)
+        if value is None:
+            conditions.append(column.is_(None))
+        elif isinstance(value, tuple):
+            conditions.append(column.in_(value))
+        else:
+            conditions.append(column == value)
+
+    statement = update(model).where(*conditions).values(**values).execution_options(synchronize_session=False)
+    if returning:
+        return db.session.execute(statement.returning(*returning)).first()
+    return db.session.execute(statement).rowcount == 1
+
+def compare_and_set(instance, expected, **values):
+    # One conditional UPDATE; False means another transaction changed the row first.
+    model = type(instance)
+    if not (model is ParkingSpot and 'status' in values):
+        if not _conditional_update(model, instance.id, expected, values):
+            return False
+        for name, value in values.items():
+            set_committed_value(instance, name, value)
+        return True
+
+    # One UPDATE per allowed old status, so the transition is known from the
+    # row that matched rather than from a possibly stale in-session copy.
+    matched = expected['status']
+    for old_status in (matched if isinstance(matched, tuple) else (matched,)):
+        spot = _conditional_update(ParkingSpot, instance.id, dict(expected, status=old_status), values,
+                                   returning=(ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.vehicle_type_supported,
+                                              ParkingSpot.is_under_maintenance))
+        if spot:
+            break
+    else:
+        return False
+
+    for name, value in values.items():
+        set_committed_value(instance, name, value)
+
+    old_bucket = spot_bucket(old_status, spot.is_under_maintenance)
+    new_bucket = spot_bucket(values['status'], spot.is_under_maintenance)
+    if old_bucket != new_bucket:
+        deltas = _pending(db.session)
+        deltas[(spot.lot_id, old_bucket)] -= 1
+        deltas[(spot.lot_id, new_bucket)] += 1
+        _pool_change(db.session, spot.lot_id, spot.vehicle_type_supported, spot.id,
+                     new_bucket == SpotCounts.AVAILABLE)
+        _map_change(db.session, spot.lot_id, spot, new_bucket)
+        _capture_generations(db.session, [spot.lot_id])
+    return True
+
+def release_booked_spots(spot_ids):
+    # Returns the lot ids of the spots released.
+    if not spot_ids:
+        return set()
+
+    released = db.session.execute(
+        update(ParkingSpot).where(ParkingSpot.id.in_(spot_ids), ParkingSpot.status == 'B').values(status='A')
+        .returning(ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.vehicle_type_supported,
+                   ParkingSpot.is_under_maintenance)
+        .execution_options(synchronize_session=False)).all()
+
+    deltas = _pending(db.session)
+    for spot in released:
+        old_bucket = spot_bucket('B', spot.is_under_maintenance)
+        new_bucket = spot_bucket('A', spot.is_under_maintenance)
+        if old_bucket != new_bucket:
+            deltas[(spot.lot_id, old_bucket)] -= 1
+            deltas[(spot.lot_id, new_bucket)] += 1
+            _pool_change(db.session, spot.lot_id, spot.vehicle_type_supported, spot.id, True)
+            _map_change(db.session, spot.lot_id, spot, new_bucket)
+    _capture_generations(db.session, [spot.lot_id for spot in released])
+    return {spot.lot_id for spot in released}
+
+def _free_spots_query(lot_ids=None, session=None):
+    query = (session or db.session).query(ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.vehicle_type_supported).filter(
+        ParkingSpot.status == 'A',
+        or_(ParkingSpot.is_under_maintenance.is_(False), ParkingSpot.is_under_maintenance.is_(None)))
+    if lot_ids is not None:
+        query = query.filter(ParkingSpot.lot_id.in_(lot_ids))
+    return query
+
+def rebuild_free_spots(lot_ids=None, session=None):
+    # Returns the number of free spots found.
+    session = session or db.session
+    pools = defaultdict(list)
+    for spot_id, lot_id, vehicle_type in _free_spots_query(lot_ids, session):
+        pools[CacheKeys.free_spots(lot_id, vehicle_type or DEFAULT_VEHICLE_TYPE)].append(spot_id)
+    if not cache_manager.is_available():
+        return sum(len(ids) for ids in pools.values())
+
+    try:
+        client = cache_manager.redis_client
+        pipe = client.pipeline(transaction=True)
+        if lot_ids is None:
+            for key in client.scan_iter(match=CacheKeys.free_spots('*', '*'), count=500):
+                pipe.delete(key)
+        else:
+            # Pools that are now empty are not in ``pools``; clear every type
+            # the lots have rather than scanning the keyspace.
+            types = session.query(ParkingSpot.lot_id, ParkingSpot.vehicle_type_supported).filter(
+                ParkingSpot.lot_id.in_(lot_ids)).distinct()
+            for lot_id, vehicle_type in types:
+                pipe.delete(CacheKeys.free_spots(lot_id, vehicle_type or DEFAULT_VEHICLE_TYPE))
+        for key, spot_ids in pools.items():
+            pipe.sadd(key, *spot_ids)
+        cache_manager._execute(pipe.execute)
+
+    except Exception as e:
+        logger.error(f"Free spot pool rebuild failed: {e}")
+    return sum(len(ids) for ids in pools.values())
+
+def _supports(vehicle_type):
+    # A spot with no type recorded takes the default one, as in the pools.
+    column = ParkingSpot.vehicle_type_supported
+    if vehicle_type == DEFAULT_VEHICLE_TYPE:
+        return or_(column == vehicle_type, column.is_(None))
+    return column == vehicle_type
+
+def _pop_free_spot(lot_id, vehicle_type):
+    if not cache_manager.is_available():
+        return None
+    key = CacheKeys.free_spots(lot_id, vehicle_type)
+    try:
+        spot_id = cache_manager._execute(cache_manager.redis_client.spop, key)
+    except Exception as e:
+        logger.error(f"Free spot pool read failed: {e}")
+        return None
+    if spot_id is None:
+        return None
+    db.session.info.setdefault(POPPED, []).append((key, int(spot_id)))
+    return int(spot_id)
+
+def allocate_spot(lot_id, vehicle_type=None):
+    # The pool only suggests a spot and compare_and_set claims it; the DB is the fallback.
+    vehicle_type = vehicle_type or DEFAULT_VEHICLE_TYPE
+    spot_id = _pop_free_spot(lot_id, vehicle_type)
+    if spot_id is not None:
+        spot = db.session.get(ParkingSpot, spot_id)
+        if (spot and spot.lot_id == lot_id and not spot.is_under_maintenance
+                and (spot.vehicle_type_supported or DEFAULT_VEHICLE_TYPE) == vehicle_type
+                and compare_and_set(spot, {'status': 'A'}, status='B')):
+            return spot
+        # Stale entry: it must not go back into the pool on rollback.
+        db.session.info[POPPED].pop()
+
+    db.session.info.setdefault(POOL_REBUILD, set()).add(lot_id)
+    candidates = _free_spots_query([lot_id]).filter(
+        _supports(vehicle_type)
+    ).order_by(ParkingSpot.id).with_for_update(skip_locked=True)
+    after = 0
+    while True:
+        # One candidate at a time, so at most one row is held locked; a
+        # spot taken between the read and the UPDATE moves on to the next.
+        row = candidates.filter(ParkingSpot.id > after).first()
+        if row is None:
+            return None
+        spot = db.session.get(ParkingSpot, row.id)
+        if compare_and_set(spot, {'status': 'A'}, status='B'):
+            return spot
+        after = row.id
+
+def _free_run(lot_id, vehicle_types):
+    # First window of consecutive spots (in ordinal order) that are all free
+    # and each match the vehicle type at the same position.
+    spots = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id).populate_existing().all()
+    for start in range(len(spots) - len(vehicle_types) + 1):
+        window = spots[start:start + len(vehicle_types)]
+        if all(spot_bucket(spot.status, spot.is_under_maintenance) == SpotCounts.AVAILABLE
+               and (spot.vehicle_type_supported or DEFAULT_VEHICLE_TYPE) == vehicle_type
+               for spot, vehicle_type in zip(window, vehicle_types)):
+            return window
+    return None
+
+def _claim_run(run):
+    claimed = []
+    for spot in run:
+        if not compare_and_set(spot, {'status': 'A'}, status='B'):
+            # Lost one to a concurrent booking; hand back the rest.
+            for taken in claimed:
+                compare_and_set(taken, {'status': 'B'}, status='A')
+            return False
+        claimed.append(spot)
+    return True
+
+def allocate_spots(vehicle_types, lot_id=None, contiguous=False):
+    # All or nothing; contiguous prefers a run of adjacent spots in one lot.
+    vehicle_types = [vehicle_type or DEFAULT_VEHICLE_TYPE for vehicle_type in vehicle_types]
+    if lot_id is not None:
+        lot_ids = [lot_id]
+    else:
+        lot_ids = [row.id for row in db.session.query(ParkingLot.id)]
+        counts = lot_counts(lot_ids)
+        lot_ids.sort(key=lambda candidate: counts.get(candidate, {}).get(SpotCounts.AVAILABLE, 0), reverse=True)
+
+    if contiguous:
+        for candidate in lot_ids:
+            run = _free_run(candidate, vehicle_types)
+            while run is not None:
+                if _claim_run(run):
+                    return run
+                run = _free_run(candidate, vehicle_types)
+
+    spots = []
+    for vehicle_type in vehicle_types:
+        for candidate in lot_ids:
+            spot = allocate_spot(candidate, vehicle_type)
+            if spot:
+                spots.append(spot)
+                break
+        else:
+            return None
+    return spots
+
+def apply_pool_changes(changes):
+    if not cache_manager.is_available():
+        return
+    try:
+        pipe = cache_manager.redis_client.pipeline(transaction=False)
+        for key, spot_id, add in changes:
+            if add:
+                pipe.sadd(key, spot_id)
+            else:
+                pipe.srem(key, spot_id)
+        cache_manager._execute(pipe.execute)
+    except Exception as e:
+        # Allocation checks every popped id against the DB and reseeds an
+        # empty pool, so a missed update only costs a fallback query.
+        logger.error(f"Free spot pool update failed: {e}")
+
+def _map_keys(lot_id):
+    return [CacheKeys.spot_map(lot_id, 'building'), CacheKeys.spot_map(lot_id, 'ordinals')] + [
+        CacheKeys.spot_map(lot_id, layer) for layer in MAP_LAYERS]
+
+def _layer_bits(bucket, vehicle_type):
+    return [int(bucket == layer) for layer in MAP_LAYERS[:-1]] + [int(vehicle_type == 'EV')]
+
+def apply_map_changes(changes):
+    if not cache_manager.is_available():
+        return
+    try:
+        script = _script(SET_SPOT_BITS_SCRIPT)
+        pipe = cache_manager.redis_client.pipeline(transaction=False)
+        for lot_id, spots in changes.items():
+            if spots is None:
+                pipe.delete(CacheKeys.spot_map(lot_id, 'layout'), *_map_keys(lot_id))
+                continue
+            for spot_id, (bucket, vehicle_type) in spots.items():
+                script(keys=_map_keys(lot_id), args=[spot_id] + _layer_bits(bucket, vehicle_type), client=pipe)
+        cache_manager._execute(pipe.execute)
+
+    except Exception as e:
+        # A map that missed an update could serve wrong bits until it
+        # expires, so drop it and let the next read rebuild it.
+        logger.error(f"Spot map update failed: {e}")
+        try:
+            keys = [key for lot_id in changes for key in [CacheKeys.spot_map(lot_id, 'layout')] + _map_keys(lot_id)]
+            cache_manager._execute(cache_manager.redis_client.delete, *keys)
+        except Exception:
+            pass
+
+def build_spot_map(lot_id):
+    # Bit 0 is the high bit of byte 0, as Redis numbers them.
+    if db.session.get(ParkingLot, lot_id) is None:
+        return None
+
+    spots = db.session.query(
+        ParkingSpot.id,
+        ParkingSpot.spot_number,
+        ParkingSpot.status,
+        ParkingSpot.vehicle_type_supported,
+        ParkingSpot.is_under_maintenance
+    ).filter(ParkingSpot.lot_id == lot_id).order_by(ParkingSpot.id).all()
+
+    bitmaps = {layer: bytearray((len(spots) + 7) // 8) for layer in MAP_LAYERS}
+    for ordinal, (spot_id, spot_number, status, vehicle_type, under_maintenance) in enumerate(spots):
+        for layer, bit in zip(MAP_LAYERS, _layer_bits(spot_bucket(status, under_maintenance), vehicle_type)):
+            if bit:
+                bitmaps[layer][ordinal // 8] |= 0x80 >> (ordinal % 8)
+
+    return {
+        'layout': [[spot_id, spot_number] for spot_id, spot_number, *_ in spots],
+        'bitmaps': {layer: bytes(bitmap) for layer, bitmap in bitmaps.items()}
+    }
+
+def _start_spot_map_build(lot_id):
+    token = uuid.uuid4().hex
+    cache_manager._execute(cache_manager.redis_client.set, CacheKeys.spot_map(lot_id, 'building'), token,
+                           ex=CacheTTL.SPOT_MAP_BUILD)
+    return token
+
+def _store_spot_map(lot_id, spot_map, token):
+    # Only installs if no bit update landed since the build started.
+    keys = _map_keys(lot_id)
+    args = [token, CacheTTL.SPOT_MAP, json.dumps(spot_map['layout'])]
+    args.extend(spot_map['bitmaps'][layer] for layer in MAP_LAYERS)
+    for ordinal, (spot_id, _) in enumerate(spot_map['layout']):
+        args.extend([spot_id, ordinal])
+    keys.insert(1, CacheKeys.spot_map(lot_id, 'layout'))
+    return cache_manager._execute(_script(INSTALL_SPOT_MAP_SCRIPT), keys=keys, args=args,
+                                  client=cache_manager.redis_client)
+
+def spot_map(lot_id):
+    token = None
+    if cache_manager.is_available():
+        try:
+            pipe = cache_manager.redis_client.pipeline(transaction=False)
+            pipe.get(CacheKeys.spot_map(lot_id, 'layout'))
+            for layer in MAP_LAYERS:
+                pipe.get(CacheKeys.spot_map(lot_id, layer))
+            for layer in MAP_LAYERS:
+                pipe.bitcount(CacheKeys.spot_map(lot_id, layer))
+            results = cache_manager._execute(pipe.execute)
+
+            layout, bitmaps, counts = results[0], results[1:1 + len(MAP_LAYERS)], results[1 + len(MAP_LAYERS):]
+            if layout is not None and None not in bitmaps:
+                return {
+                    'layout': json.loads(layout),
+                    'bitmaps': {layer: base64.b64encode(bitmap).decode() for layer, bitmap in zip(MAP_LAYERS, bitmaps)},
+                    'counts': dict(zip(MAP_LAYERS, counts))
+                }
+            token = _start_spot_map_build(lot_id)
+        except Exception as e:
+            logger.error(f"Spot map read failed: {e}")
+
+    built = build_spot_map(lot_id)
+    if built is None:
+        return None
+    if token is not None:
+        try:
+            _store_spot_map(lot_id, built, token)
+        except Exception as e:
+            logger.error(f"Spot map store failed: {e}")
+
+    return {
+        'layout': built['layout'],
+        'bitmaps': {layer: base64.b64encode(bitmap).decode() for layer, bitmap in built['bitmaps'].items()},
+        'counts': {layer: sum(bin(byte).count('1') for byte in bitmap) for layer, bitmap in built['bitmaps'].items()}
+    }
+
+def lot_summary(lot_ids=None):
+    maintenance = or_(ParkingSpot.is_under_maintenance.is_(True), ParkingSpot.status == 'M')
+
+    def count_where(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    query = db.session.query(
+        ParkingLot.id,
+        func.count(ParkingSpot.id),
+        count_where(and_(ParkingSpot.status == 'A', not_(maintenance))),
+        count_where(and_(ParkingSpot.status == 'B', not_(maintenance))),
+        count_where(and_(ParkingSpot.status == 'O', not_(maintenance))),
+        count_where(maintenance),
+    ).outerjoin(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id).group_by(ParkingLot.id)
+    if lot_ids is not None:
+        query = query.filter(ParkingLot.id.in_(lot_ids))
+
+    return {
+        lot_id: {
+            SpotCounts.TOTAL: total,
+            SpotCounts.AVAILABLE: available or 0,
+            SpotCounts.BOOKED: booked or 0,
+            SpotCounts.OCCUPIED: occupied or 0,
+            SpotCounts.MAINTENANCE: under_maintenance or 0,
+        }
+        for lot_id, total, available, booked, occupied, under_maintenance in query
+    }
+
+def rebuild_lot_counts(lot_ids=None):
+    # Returns the DB counts whether or not they could be installed.
+    if not cache_manager.is_available():
+        return lot_summary(lot_ids)
+    if lot_ids is None:
+        lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)]
+
+    token = uuid.uuid4().hex
+    try:
+        client = cache_manager.redis_client
+        pipe = client.pipeline(transaction=True)
+        for lot_id in lot_ids:
+            pipe.set(CacheKeys.lot_counts_building(lot_id), token, ex=CacheTTL.LOT_COUNTS_BUILD)
+            pipe.delete(CacheKeys.lot_counts(lot_id))
+        cache_manager._execute(pipe.execute)
+    except Exception as e:
+        logger.error(f"Spot counter rebuild failed: {e}")
+        return lot_summary(lot_ids)
+
+    counts = lot_summary(lot_ids)
+    try:
+        script = _script(INSTALL_COUNTS_SCRIPT)
+        pipe = client.pipeline(transaction=False)
+        for lot_id, lot_counts in counts.items():
+            fields = [item for pair in lot_counts.items() for item in pair]
+            script(keys=[CacheKeys.lot_counts(lot_id), CacheKeys.lot_counts_generation(lot_id),
+                         CacheKeys.lot_counts_building(lot_id)],
+                   args=[token, CacheTTL.LOT_COUNTS] + fields, client=pipe)
+        cache_manager._execute(pipe.execute)
+
+    except Exception as e:
+        logger.error(f"Spot counter rebuild failed: {e}")
+    return counts
+
+def lot_counts(lot_ids):
+    lot_ids = list(lot_ids)
+    if not lot_ids:
+        return {}
+    if not cache_manager.is_available():
+        return lot_summary(lot_ids)
+
+    try:
+        pipe = cache_manager.redis_client.pipeline(transaction=False)
+        for lot_id in lot_ids:
+            pipe.hgetall(CacheKeys.lot_counts(lot_id))
+        results = cache_manager._execute(pipe.execute)
+    except Exception as e:
+        logger.error(f"Spot counter read failed: {e}")
+        return lot_summary(lot_ids)
+
+    counts, missing = {}, []
+    for lot_id, raw in zip(lot_ids, results):
+        if raw:
+            counts[lot_id] = {field.decode(): int(value) for field, value in raw.items() if field != b'gen'}
+        else:
+            missing.append(lot_id)
+    if missing:
+        counts.update(rebuild_lot_counts(missing))
+    return counts
@@ -0,0 +1,44 @@
+from sqlalchemy import event
+
+# Opt-in profile for single-node deployments that stay on SQLite. WAL lets
+# readers run alongside the one writer, and busy_timeout makes a writer wait
+# for the lock instead of failing with "database is locked".
+
+def sqlite_pragmas(config):
+    return [
+        ('journal_mode', 'WAL'),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('synchronous', 'NORMAL'),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        ('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))),
+        ('temp_store', 'MEMORY'),
+    ]
+
+def is_tuned(app):
+    return bool(app.config.get('SQLITE_TUNING')) and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+
+def enable_sqlite_tuning(app, db):
+    if not is_tuned(app):
+        return False
+
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return True
+
+def run_maintenance(db, optimize=False):
+    # TRUNCATE resets the -wal file so it cannot grow without bound between
+    # the automatic checkpoints; optimize refreshes planner statistics.
+    with db.engine.connect() as connection:
+        busy, log_frames, checkpointed = connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        if optimize:
+            connection.exec_driver_sql('PRAGMA optimize')
+    return {'busy': bool(busy), 'log_frames': log_frames, 'checkpointed': checkpointed}
@@ -3,10 +3,21 @@ import os
 from datetime import datetime, timedelta
 from flask import render_template
 from celery import Celery
+from sqlalchemy.orm import joinedload
 from .models import User, Reservation, ParkingSpot
 from .utils import send_email_utility, send_html_email
 
 celery_app = Celery('tasks')
+_worker = {'pid': None, 'app': None}
+
+def worker_app():
+    # The frequent tasks share one app per worker process, and with it one
+    # engine and connection pool, instead of building a new one every run.
+    if _worker['pid'] != os.getpid():
+        from .app import create_app
+        _worker['app'] = create_app()
+        _worker['pid'] = os.getpid()
+    return _worker['app']
 
 @celery_app.task(name='tasks.export_history_csv')
 def export_history_csv(user_id):
@@ -18,7 +29,7 @@ def export_history_csv(user_id):
         if not user:
             return f"User with ID {user_id} not found"
 
-        hist_rec = Reservation.query.filter_by(user_id=user_id).order_by(Reservation.parking_timestamp.desc()).all()
+        hist_rec = Reservation.query.filter_by(user_id=user_id).options(joinedload(Reservation.lot)).order_by(Reservation.parking_timestamp.desc()).all()
         filepath = os.path.join("exports", f"{user.username}_history_{datetime.now().strftime('%Y%m%d')}.csv")
         os.makedirs('exports', exist_ok=True)
 
@@ -41,7 +52,7 @@ def export_history_csv(user_id):
 
                 writer.writerow({
                     'record_id': rec.id,
-                    'location_name': rec.prime_location_name,
+                    'location_name': rec.location_name,
                     'spot_number': spot_number,
                     'vehicle_number': rec.vehicle_number,
                     'start_time': rec.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S') if rec.parking_timestamp else 'N/A',
@@ -154,7 +165,7 @@ def export_bulk_to_admin_email(admin_user_id):
                 writer.writeheader()
 
                 for u in users:
-                    reservations = Reservation.query.filter_by(user_id=u.id).order_by(Reservation.parking_timestamp.desc()).all()
+                    reservations = Reservation.query.filter_by(user_id=u.id).options(joinedload(Reservation.lot)).order_by(Reservation.parking_timestamp.desc()).all()
 
                     if reservations:
                         for reservation in reservations:
@@ -172,7 +183,7 @@ def export_bulk_to_admin_email(admin_user_id):
                                 'phone_number': u.phone_number,
                                 'loyalty_points': u.loyalty_points or 0,
                                 'record_id': reservation.id,
-                                'location_name': reservation.prime_location_name,
+                                'location_name': reservation.location_name,
                                 'spot_number': reservation.spot_id,
                                 'vehicle_number': reservation.vehicle_number,
                                 'start_time': reservation.parking_timestamp.strftime("%Y-%m-%d %H:%M:%S")  if reservation.parking_timestamp else 'N/A',
@@ -280,7 +291,7 @@ def send_monthly_report(user_id):
             return f"User with ID {user_id} not found"
 
         one_month = datetime.now() - timedelta(days=30)
-        monthly_rec = Reservation.query.filter(
+        monthly_rec = Reservation.query.options(joinedload(Reservation.lot)).filter(
             Reservation.user_id == user_id,Reservation.parking_timestamp >= one_month).all()
         tot_spent = sum(r.parking_cost or 0 for r in monthly_rec)
         tot_sessions = len(monthly_rec)
@@ -294,7 +305,7 @@ def send_monthly_report(user_id):
 
         loc_usage = {}
         for rec in monthly_rec:
-            loc = rec.prime_location_name
+            loc = rec.location_name
             loc_usage[loc] = loc_usage.get(loc, 0) + 1
 
         most_used = max(loc_usage.items(), key=lambda x: x[1]) if loc_usage else ("None", 0)
@@ -343,7 +354,7 @@ def export_user_history_to_email(user_id):
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"{user.username}_history_{timestamp}.csv"
             filepath = os.path.join("exports", filename)
-            reservations = Reservation.query.filter_by(user_id=user.id).order_by(Reservation.parking_timestamp.desc()).all()
+            reservations = Reservation.query.filter_by(user_id=user.id).options(joinedload(Reservation.lot)).order_by(Reservation.parking_timestamp.desc()).all()
             with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
                 fieldnames = ['location', 'spot_number', 'vehicle', 'start_time', 'end_time', 'duration', 'cost']
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
@@ -363,7 +374,7 @@ def export_user_history_to_email(user_id):
                     spot_number = reservation.spot.spot_number if reservation.spot else 'N/A'
 
                     writer.writerow({
-                        'location': reservation.prime_location_name,
+                        'location': reservation.location_name,
                         'spot_number': spot_number,
                         'vehicle': reservation.vehicle_number,
                         'start_time': reservation.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S') if reservation.parking_timestamp else 'N/A',
@@ -421,37 +432,84 @@ def export_user_history_to_email(user_id):
         except Exception as e:
             return f"Error exporting user history: {str(e)}"
 
-@celery_app.task(name='tasks.auto_cancel_expired_bookings')
-def auto_cancel_expired_bookings():
-    from .models import db, ParkingSpot
-    from .app import create_app
-    from .cache_utils import invalidate_parking_cache, invalidate_admin_cache
+@celery_app.task(name='tasks.expire_due_bookings')
+def expire_due_bookings():
+    from .models import db
+    from .booking_expiry import expire_due
 
-    app = create_app()
+    app = worker_app()
     with app.app_context():
         try:
-            current_utc = datetime.utcnow()
-            expiry_cutoff = current_utc - timedelta(hours=12)
-            expired_bookings = Reservation.query.filter(
-                Reservation.booking_status == 'booked',
-                Reservation.booking_timestamp <= expiry_cutoff).all()
+            return f"Expired {expire_due()} due bookings"
 
-            cancelled_count = 0
-            for booking in expired_bookings:
-                spot = ParkingSpot.query.get(booking.spot_id)
-                if spot and spot.status == 'B':
-                    spot.status = 'A'
-                    invalidate_parking_cache(spot.lot_id)
+        except Exception as e:
+            db.session.rollback()
+            return f"Error expiring due bookings: {str(e)}"
 
-                db.session.delete(booking)
-                cancelled_count += 1
+@celery_app.task(name='tasks.auto_cancel_expired_bookings')
+def auto_cancel_expired_bookings():
+    # Safety net behind expire_due_bookings: catches bookings whose deadline
+    # never reached the index and resyncs the index with the DB.
+    from .models import db
+    from .booking_expiry import SWEEP_BATCH, expire_due, rebuild_deadlines
 
-            db.session.commit()
-            invalidate_parking_cache()
-            invalidate_admin_cache()
+    app = worker_app()
+    with app.app_context():
+        try:
+            cancelled_count = 0
+            while True:
+                expired = expire_due(from_db=True)
+                cancelled_count += expired
+                if expired < SWEEP_BATCH:
+                    break
 
+            rebuild_deadlines()
             return f"Successfully auto-cancelled {cancelled_count} expired bookings"
 
         except Exception as e:
             db.session.rollback()
-            return f"Error auto-cancelling expired bookings: {str(e)}"
\ No newline at end of file
+            return f"Error auto-cancelling expired bookings: {str(e)}"
+
+@celery_app.task(name='tasks.sqlite_maintenance')
+def sqlite_maintenance(optimize=False):
+    from .models import db
+    from .sqlite_tuning import is_tuned, run_maintenance
+
+    app = worker_app()
+    if not is_tuned(app):
+        return "SQLite tuning is off, nothing to do"
+
+    with app.app_context():
+        try:
+            result = run_maintenance(db, optimize)
+            return f"WAL checkpoint: {result['checkpointed']}/{result['log_frames']} frames, busy={result['busy']}"
+
+        except Exception as e:
+            return f"Error running SQLite maintenance: {str(e)}"
+
+@celery_app.task(name='tasks.warm_cache_family', bind=True, max_retries=30)
+def warm_cache_family(self, family_name, lot_id=None):
+    from .cache_utils import cache_manager
+    from .cache_warming import acquire_slot, release_slot, warm_family, WarmSettings
+
+    app = worker_app()
+    with app.app_context():
+        if not cache_manager.is_available():
+            return f"Skipped warming {family_name}: cache unavailable"
+
+        slot = acquire_slot()
+        if slot is None:
+            raise self.retry(countdown=WarmSettings.RETRY_DELAY)
+
+        try:
+            rebuilt = warm_family(family_name, lot_id)
+            target = f"{family_name}:{lot_id}" if lot_id is not None else family_name
+            if rebuilt:
+                return f"Warmed cache family {target}"
+            return f"Skipped warming {target}: rebuild already in progress"
+
+        except Exception as e:
+            return f"Error warming cache family {family_name}: {str(e)}"
+
+        finally:
+            release_slot(slot)
@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from cryptography.fernet import Fernet
+
+# backend.app builds the app at import time, so the environment has to be
+# in place first. Each run gets its own SQLite file in WAL mode, which lets
+# the threaded tests hit it concurrently.
+DB_DIR = tempfile.mkdtemp(prefix="parking-tests-")
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR, 'test.db')}"
+os.environ['SQLITE_TUNING'] = 'true'
+os.environ.setdefault('JWT_SECRET_KEY', 'parking-test-suite-jwt-secret-key-0001')
+os.environ.setdefault('FERNET_SECRET_KEY', Fernet.generate_key().decode())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app import app as flask_app  # noqa: E402
+from backend.cache_utils import cache_manager  # noqa: E402
+from backend.models import db, User, ParkingLot, ParkingSpot  # noqa: E402
+from backend.routes.api_resources import create_access_token  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def redis_cache():
+    """Point the cache at an in-memory Redis for tests of the Redis-backed state."""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    saved = cache_manager.redis_client, cache_manager.invalidate_script, cache_manager.release_lock_script
+
+    client = fakeredis.FakeRedis()
+    cache_manager.redis_client = client
+    cache_manager.invalidate_script = client.register_script(cache_manager.invalidate_script.script)
+    cache_manager.release_lock_script = client.register_script(cache_manager.release_lock_script.script)
+    cache_manager.breaker.record_success()
+    yield client
+
+    cache_manager.redis_client, cache_manager.invalidate_script, cache_manager.release_lock_script = saved
+    cache_manager.breaker.trip()
+
+
+@pytest.fixture
+def make_lot(app):
+    def make_lot(spots=5, vehicle_types=None, name='central'):
+        with app.app_context():
+            lot = ParkingLot(prime_location_name=f"{name}", price_per_hour=10.0, address='1 Main Road',
+                             pin_code='500001', total_number_of_spots=spots)
+            db.session.add(lot)
+            db.session.flush()
+            for i in range(spots):
+                db.session.add(ParkingSpot(lot_id=lot.id, spot_number=f"S{i + 1:03d}", status='A',
+                                           vehicle_type_supported=(vehicle_types or {}).get(i, 'non-EV'),
+                                           is_under_maintenance=False))
+            db.session.commit()
+            return lot.id
+    return make_lot
+
+
+@pytest.fixture
+def make_user(app):
+    count = {'n': 0}
+
+    def make_user(loyalty_points=0, role='user'):
+        count['n'] += 1
+        with app.app_context():
+            user = User(username=f"driver{count['n']}", phone_number=f"90000{count['n']:05d}",
+                        email=f"driver{count['n']}@example.com", password_hash='x',
+                        loyalty_points=loyalty_points, role=role)
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': f"Bearer {create_access_token(user.id)}"}
+    return make_user
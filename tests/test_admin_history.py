@@ -0,0 +1,63 @@
+import json
+from datetime import datetime, timedelta
+
+from backend import app as app_module, cache_warming, queries
+from backend.cache_warming import Mutations, schedule_warm
+from backend.models import db, ParkingSpot, Reservation
+
+
+def test_full_history_streams_in_batches(app, make_lot, make_user, monkeypatch):
+    monkeypatch.setattr(queries, 'HISTORY_BATCH_SIZE', 2)
+    lot_id = make_lot(spots=1)
+    user_id, _ = make_user()
+    _, admin = make_user(role='admin')
+    with app.app_context():
+        spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).one().id
+        for hours in range(5):
+            db.session.add(Reservation(user_id=user_id, user_name='driver', spot_id=spot_id, lot_id=lot_id,
+                                       prime_location_name='central', vehicle_number='TS09AB0001',
+                                       booking_status='completed',
+                                       booking_timestamp=datetime(2025, 1, 1) + timedelta(hours=hours)))
+        db.session.commit()
+        expected = [row.id for row in Reservation.query.order_by(*queries.RESERVATION_ORDER)]
+
+    with app.test_request_context(headers=admin):
+        response = app_module.get_all_reservations()
+        chunks = list(response.response)
+
+    body = json.loads(''.join(chunks))
+    assert body['success'] and [row['id'] for row in body['history']] == expected
+    assert len(chunks) == 5  # opening, three batches, closing
+
+
+def test_reservation_writes_do_not_rebuild_the_full_history(app, monkeypatch):
+    queued = []
+    monkeypatch.setattr(cache_warming, '_enqueue', lambda name, lot_id: queued.append(name) or True)
+
+    with app.app_context():
+        schedule_warm(Mutations.BOOK)
+
+    assert 'parking_lots_all' in queued
+    assert not {'admin_history', 'admin_parking_records', 'admin_users'} & set(queued)
+
+
+def test_unpaged_admin_lists_stream_from_the_db(app, make_lot, make_user, monkeypatch):
+    monkeypatch.setattr(queries, 'HISTORY_BATCH_SIZE', 2)
+    lot_id = make_lot(spots=1)
+    user_id, _ = make_user()
+    _, admin = make_user(role='admin')
+    with app.app_context():
+        spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).one().id
+        for hours in range(3):
+            db.session.add(Reservation(user_id=user_id, user_name='driver', spot_id=spot_id, lot_id=lot_id,
+                                       prime_location_name='central', vehicle_number='TS09AB0001',
+                                       booking_status='completed',
+                                       booking_timestamp=datetime(2025, 1, 1) + timedelta(hours=hours)))
+        db.session.commit()
+
+    client = app.test_client()
+    records = client.get('/api/admin/parking-records', headers=admin)
+    assert records.is_streamed and len(records.get_json()['records']) == 3
+    users = client.get('/api/admin/users', headers=admin).get_json()['users']
+    assert [user['id'] for user in users] == [user_id]
+    assert client.get('/api/admin/feedback', headers=admin).get_json() == {'success': True, 'feedback': []}
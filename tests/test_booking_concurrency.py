@@ -0,0 +1,84 @@
+import threading
+from collections import Counter
+
+from backend.cache_utils import CacheKeys
+from backend.models import db, ParkingSpot, Reservation
+from backend.spot_state import SpotCounts, compare_and_set, lot_counts, lot_summary, rebuild_lot_counts
+
+THREADS = 16
+
+
+def run_together(targets):
+    start = threading.Barrier(len(targets))
+    results = [None] * len(targets)
+
+    def run(i, target):
+        start.wait()
+        results[i] = target()
+
+    threads = [threading.Thread(target=run, args=(i, target)) for i, target in enumerate(targets)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_exactly_one_booking_wins_a_contested_spot(app, make_lot, make_user):
+    lot_id = make_lot(spots=1)
+    with app.app_context():
+        spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).one().id
+    users = [make_user() for _ in range(THREADS)]
+
+    def book(headers, index):
+        return lambda: app.test_client().post('/api/user/book-spot', headers=headers, json={
+            'spot_id': spot_id, 'vehicle_number': f'KA01AB{index:04d}'}).status_code
+
+    statuses = Counter(run_together([book(headers, i) for i, (_, headers) in enumerate(users)]))
+
+    assert statuses[201] == 1
+    assert statuses[201] + statuses[409] + statuses[400] == THREADS
+    with app.app_context():
+        assert Reservation.query.filter_by(spot_id=spot_id).count() == 1
+        assert db.session.get(ParkingSpot, spot_id).status == 'B'
+
+
+def test_exactly_one_occupy_wins_a_double_submit(app, make_lot, make_user):
+    lot_id = make_lot(spots=1)
+    user_id, headers = make_user()
+    client = app.test_client()
+    with app.app_context():
+        spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).one().id
+    booking_id = client.post('/api/user/book-spot', headers=headers,
+                             json={'spot_id': spot_id, 'vehicle_number': 'KA01AB0001'}).get_json()['booking_id']
+
+    def occupy():
+        return app.test_client().post('/api/user/occupy-spot', headers=headers,
+                                      json={'booking_id': booking_id}).status_code
+
+    statuses = Counter(run_together([occupy] * THREADS))
+
+    assert statuses[200] == 1
+    with app.app_context():
+        assert db.session.get(ParkingSpot, spot_id).status == 'O'
+
+
+def test_counters_use_the_status_the_update_matched(app, redis_cache, make_lot):
+    lot_id = make_lot(spots=1)
+    with app.app_context():
+        lot_counts([lot_id])
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id).one()
+        assert spot.status == 'A'
+
+        # Another writer occupies the spot behind our in-session copy's back.
+        with db.engine.begin() as connection:
+            connection.execute(db.update(ParkingSpot).where(ParkingSpot.id == spot.id).values(status='O'))
+        rebuild_lot_counts([lot_id])
+        assert spot.status == 'A'
+
+        assert compare_and_set(spot, {'status': ('O', 'B')}, status='A')
+        db.session.commit()
+
+        assert redis_cache.exists(CacheKeys.lot_counts(lot_id))
+        assert lot_counts([lot_id]) == lot_summary([lot_id])
+        assert lot_summary([lot_id])[lot_id][SpotCounts.AVAILABLE] == 1
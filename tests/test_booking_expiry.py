@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from backend.booking_expiry import BOOKING_HOLD, SWEEP_BATCH, expire_due
+from backend.models import db, ParkingSpot, Reservation
+from backend.tasks import worker_app
+
+
+def add_booking(lot_id, user_id, spot, booked_at, **fields):
+    spot.status = 'B'
+    reservation = Reservation(user_id=user_id, user_name='driver', spot_id=spot.id, lot_id=lot_id,
+                              prime_location_name='central', vehicle_number=f'AP09AB{spot.id:04d}',
+                              booking_status='booked', booking_timestamp=booked_at, **fields)
+    db.session.add(reservation)
+    return reservation
+
+
+def test_expiry_only_removes_bookings_that_never_ended(app, make_lot, make_user):
+    lot_id = make_lot(spots=2)
+    user_id, _ = make_user()
+    now = datetime(2025, 6, 1, 12, 0)
+    with app.app_context():
+        stale, ended = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id).all()
+        add_booking(lot_id, user_id, stale, now - BOOKING_HOLD - timedelta(minutes=1))
+        kept = add_booking(lot_id, user_id, ended, now - BOOKING_HOLD - timedelta(minutes=1),
+                           leaving_timestamp=now - timedelta(hours=1))
+        db.session.commit()
+        kept_id = kept.id
+
+        assert expire_due(now=now, from_db=True) == 1
+        assert [reservation.id for reservation in Reservation.query] == [kept_id]
+        assert db.session.get(ParkingSpot, stale.id).status == 'A'
+
+
+def test_ended_bookings_do_not_fill_the_db_sweep(app, make_lot, make_user):
+    lot_id = make_lot(spots=2)
+    user_id, _ = make_user()
+    now = datetime(2025, 6, 1, 12, 0)
+    with app.app_context():
+        ended, stale = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id).all()
+        for minutes in range(SWEEP_BATCH + 1):
+            add_booking(lot_id, user_id, ended, now - BOOKING_HOLD - timedelta(days=1, minutes=minutes),
+                        leaving_timestamp=now - timedelta(hours=1))
+        add_booking(lot_id, user_id, stale, now - BOOKING_HOLD - timedelta(minutes=1))
+        db.session.commit()
+
+        assert expire_due(now=now, from_db=True) == 1
+        assert db.session.get(ParkingSpot, stale.id).status == 'A'
+        assert Reservation.query.count() == SWEEP_BATCH + 1
+
+
+def test_worker_tasks_reuse_one_app():
+    assert worker_app() is worker_app()
@@ -0,0 +1,235 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend import cache_utils, cache_warming
+from backend.cache_utils import (CacheCodec, CacheKeys, CacheManager, CacheTags, CircuitBreaker, LocalCache,
+                                 cache_manager, invalidate_parking_cache, invalidate_user_cache)
+from backend.cache_warming import Mutations, WarmSettings, acquire_slot, release_slot, schedule_warm, warm_family
+
+
+def test_cancel_drops_the_parking_listing(app, redis_cache, make_lot, make_user, monkeypatch):
+    monkeypatch.setattr(cache_warming, '_enqueue', lambda name, lot_id: True)
+    lot_id = make_lot(spots=2)
+    _, headers = make_user()
+    client = app.test_client()
+    client.get('/api/user/parking-lots', headers=headers)  # starts the ETag epoch
+
+    booked = client.post(f'/api/user/parking-lots/{lot_id}/book', json={'vehicle_number': 'TS09AB0001'},
+                         headers=headers).get_json()
+    listing = client.get('/api/user/parking-lots', headers=headers)
+    assert listing.get_json()['parking_lots'][0]['available'] == 1
+
+    client.post('/api/user/cancel-booking', json={'booking_id': booked['booking_id']}, headers=headers)
+
+    again = client.get('/api/user/parking-lots', headers={**headers, 'If-None-Match': listing.headers['ETag']})
+    assert again.status_code == 200
+    assert again.get_json()['parking_lots'][0]['available'] == 2
+
+
+def test_warm_refresh_moves_the_etag(app, redis_cache, make_lot, make_user):
+    make_lot(spots=2)
+    _, headers = make_user()
+    client = app.test_client()
+    client.get('/api/user/parking-lots', headers=headers)
+
+    etag = client.get('/api/user/parking-lots', headers=headers).headers['ETag']
+    assert client.get('/api/user/parking-lots', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        assert warm_family('user_parking_lots')
+    assert client.get('/api/user/parking-lots', headers={**headers, 'If-None-Match': etag}).status_code == 200
+
+
+def test_crashed_worker_slot_is_reclaimed(app, redis_cache, monkeypatch):
+    monkeypatch.setattr(WarmSettings, 'SLOT_TTL', 1)
+    crashed = [acquire_slot() for _ in range(WarmSettings.MAX_CONCURRENT)]
+    assert None not in crashed and acquire_slot() is None
+
+    time.sleep(1.1)  # the crashed workers never release
+    slot = acquire_slot()
+    assert slot is not None
+
+    # A late release from a lease that already expired must not free the new holder's slot.
+    release_slot(next(lease for lease in crashed if lease[0] == slot[0]))
+    assert redis_cache.get(slot[0]).decode() == slot[1]
+    release_slot(slot)
+    assert acquire_slot() is not None
+
+
+def test_msgpack_round_trips_like_json():
+    msgpack = pytest.importorskip('msgpack')
+    value = {7: {'spots': [{1: 'A', None: 'B', 2.5: 'O'}]}, 'lots': (1, 2)}
+
+    assert CacheCodec.decode(CacheCodec.encode(value, 'msgpack')) == CacheCodec.decode(CacheCodec.encode(value))
+    # Payloads written before keys were normalised still decode.
+    legacy = CacheCodec.MAGIC + CacheCodec.CODECS['msgpack'] + CacheCodec.COMPRESSIONS[None] + msgpack.packb({7: 1})
+    assert CacheCodec.decode(legacy) == {7: 1}
+
+
+def test_breaker_probes_and_backs_off():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05, max_reset_timeout=0.15)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+
+    breaker.record_failure()
+    assert breaker.current_timeout == 0.1
+    time.sleep(0.06)
+    assert not breaker.allow()
+    time.sleep(0.05)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.current_timeout == 0.15  # capped
+
+    time.sleep(0.16)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.current_timeout == 0.05
+
+
+def test_tag_invalidation_drops_only_tagged_keys(redis_cache):
+    for key, tags in [('parking:lot:1', ['parking', 'lot:1']), ('parking:lot:2', ['parking', 'lot:2']),
+                      ('user:profile:1', ['user:1'])]:
+        cache_manager.set(key, {'key': key}, tags=tags)
+
+    assert cache_manager.invalidate_tags('lot:1') == 1
+    assert cache_manager.get('parking:lot:1') is None and cache_manager.get('parking:lot:2') is not None
+    cache_manager.invalidate_tags('parking', 'user:1')
+    assert not redis_cache.exists('parking:lot:2', 'user:profile:1', CacheTags.key('parking'))
+
+
+def test_generation_bump_moves_versioned_keys(redis_cache, monkeypatch):
+    monkeypatch.setattr(cache_manager, 'versioning', True)
+    lots, spots = CacheKeys.parking_lots_all(), CacheKeys.parking_spots(1)
+    cache_manager.set(lots, [1], tags=[CacheTags.PARKING])
+    assert not redis_cache.exists(CacheTags.key(CacheTags.PARKING))  # generations replace the tag index
+
+    invalidate_parking_cache(1)
+    assert CacheKeys.parking_lots_all() == lots and CacheKeys.parking_spots(1) != spots
+    invalidate_parking_cache()
+    assert CacheKeys.parking_lots_all() != lots
+    assert cache_manager.get(CacheKeys.parking_lots_all()) is None and redis_cache.exists(lots)
+
+
+def test_l1_invalidation_reaches_other_workers(redis_cache, monkeypatch):
+    monkeypatch.setattr(cache_manager, 'local', LocalCache(ttl=60))
+    other = CacheManager()
+    other.redis_client = redis_cache
+    other.invalidate_script = redis_cache.register_script(cache_manager.invalidate_script.script)
+    other.local = LocalCache(ttl=60)
+
+    cache_manager.set('user:profile:1', {'name': 'before'}, tags=['user:1'])
+    assert other.get('user:profile:1') == {'name': 'before'}
+    try:
+        cache_manager.set('user:profile:1', {'name': 'after'}, tags=['user:1'])
+        assert other.get('user:profile:1') == {'name': 'before'}  # served from its L1
+
+        cache_manager.invalidate_tags('user:1')
+        deadline = time.monotonic() + 3
+        while other.local.get('user:profile:1') is not None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert other.get('user:profile:1') is None
+    finally:
+        other.subscriber.stop()
+
+
+@pytest.mark.parametrize('codec', ['json', 'orjson', 'msgpack'])
+def test_codecs_round_trip(codec):
+    value = {'lots': [{'id': i, 'name': f'lot {i}', 'free': i * 1.5} for i in range(200)], 'none': None}
+    small = CacheCodec.encode(value, codec, 'zlib', threshold=1 << 20)
+    large = CacheCodec.encode(value, codec, 'zlib', threshold=64)
+
+    assert small[2:3] == CacheCodec.COMPRESSIONS[None] and large[2:3] == CacheCodec.COMPRESSIONS['zlib']
+    assert len(large) < len(small)
+    assert CacheCodec.decode(small) == CacheCodec.decode(large) == value
+
+
+def test_codec_falls_back_when_libraries_are_missing(monkeypatch):
+    monkeypatch.setattr(cache_utils, 'lz4', None)
+    monkeypatch.setattr(cache_utils, 'msgpack', None)
+    raw = CacheCodec.encode({'a': 'x' * 100}, 'msgpack', 'lz4', threshold=10)
+
+    assert raw[1:3] == CacheCodec.CODECS['json'] + CacheCodec.COMPRESSIONS['zlib']
+    assert CacheCodec.decode(raw) == {'a': 'x' * 100}
+    assert CacheCodec.decode(b'{"plain": 1}') == {'plain': 1}
+
+
+def test_concurrent_misses_compute_once(redis_cache):
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'built': True}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache_manager.get_or_compute('parking:lot:9', build)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and results == [{'built': True}] * 8
+
+
+def test_xfetch_recomputes_early_and_serves_stale_meanwhile(redis_cache, monkeypatch):
+    monkeypatch.setattr(cache_utils.random, 'random', lambda: 0.5)
+    cache_manager.set('parking:lot:9', {'__cached__': 1, 'v': 'old', 'exp': time.time() + 5, 'd': 60}, 60)
+
+    assert cache_manager.get_or_compute('parking:lot:9', lambda: 'new', beta=0) == 'old'
+    token = cache_manager.acquire_lock('parking:lot:9')
+    assert cache_manager.get_or_compute('parking:lot:9', lambda: 'new') == 'old'  # someone else is on it
+    cache_manager.release_lock('parking:lot:9', token)
+    assert cache_manager.get_or_compute('parking:lot:9', lambda: 'new') == 'new'
+
+
+def test_warms_coalesce_until_the_rebuild_starts(app, redis_cache, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(cache_warming, '_dispatcher', lambda: SimpleNamespace(put_nowait=dispatched.append))
+    monkeypatch.setattr(cache_warming.broker_breaker, 'allow', lambda: True)
+
+    first = schedule_warm(Mutations.LOT_CREATE)
+    assert 'parking_lots_all' in first
+    assert schedule_warm(Mutations.LOT_CREATE) == [] and len(dispatched) == len(first)
+
+    with app.app_context():
+        warm_family('parking_lots_all')
+    assert schedule_warm(Mutations.LOT_CREATE) == ['parking_lots_all']
+
+
+def test_family_stats_add_up_per_family(redis_cache):
+    cache_manager.metrics.drain()
+    cache_manager.set('user:profile:1', {'id': 1}, tags=['user:1'])
+    cache_manager.get('user:profile:1')
+    cache_manager.get('user:profile:2')
+    cache_manager.invalidate_tags('user:1')
+    cache_manager.get_or_compute('parking:lot:3', lambda: {'id': 3})
+
+    stats = cache_manager.family_stats()
+    assert stats['user:profile']['hits'] == 1 and stats['user:profile']['misses'] == 1
+    assert stats['user:profile']['hit_ratio'] == 0.5 and stats['user:profile']['invalidations'] == 1
+    assert stats['parking:lot']['recomputes'] == 1 and stats['parking:lot']['sets'] == 1
+
+
+def test_etag_tracks_only_its_scopes(app, redis_cache, make_lot, make_user):
+    make_lot(spots=2)
+    user_id, headers = make_user()
+    client = app.test_client()
+    client.get('/api/user/parking-lots', headers=headers)
+    etag = client.get('/api/user/parking-lots', headers=headers).headers['ETag']
+
+    invalidate_user_cache(user_id)
+    cached = client.get('/api/user/parking-lots', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.get_data() == b''
+
+    invalidate_parking_cache(1)
+    assert client.get('/api/user/parking-lots', headers={**headers, 'If-None-Match': etag}).status_code == 200
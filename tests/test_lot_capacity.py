@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from backend.models import db, MaintenanceRequest, ParkingSpot, Reservation
+
+
+def edit_lot(app, headers, lot_id, capacity):
+    return app.test_client().put(f'/api/admin/parking-lots/{lot_id}', headers=headers, json={
+        'name': 'central', 'address': '1 Main Road', 'pin_code': '500001', 'price_per_hour': 10,
+        'capacity': capacity})
+
+
+def test_capacity_cut_keeps_the_history_of_removed_spots(app, make_lot, make_user):
+    lot_id = make_lot(spots=3)
+    user_id, _ = make_user()
+    _, admin = make_user(role='admin')
+    with app.app_context():
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id.desc()).first()
+        db.session.add(Reservation(user_id=user_id, user_name='driver', spot_id=spot.id, lot_id=lot_id,
+                                   prime_location_name='central', vehicle_number='KA01AB0001',
+                                   booking_status='completed', leaving_timestamp=datetime(2024, 1, 1), parking_cost=20))
+        db.session.add(MaintenanceRequest(spot_id=spot.id, prime_location_name='central',
+                                          issue_description='Broken barrier', reported_by='driver'))
+        db.session.commit()
+
+    response = edit_lot(app, admin, lot_id, 1)
+
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        assert ParkingSpot.query.filter_by(lot_id=lot_id).count() == 1
+        reservation = Reservation.query.one()
+        assert reservation.spot_id is None and reservation.parking_cost == 20
+        assert MaintenanceRequest.query.one().spot_id is None
+
+
+def test_capacity_cut_skips_spots_with_open_bookings(app, make_lot, make_user):
+    lot_id = make_lot(spots=3)
+    _, headers = make_user()
+    _, admin = make_user(role='admin')
+    with app.app_context():
+        booked_id = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id.desc()).first().id
+    assert app.test_client().post('/api/user/book-spot', headers=headers, json={
+        'spot_id': booked_id, 'vehicle_number': 'KA01AB0001'}).status_code == 201
+
+    assert edit_lot(app, admin, lot_id, 1).status_code == 200
+    with app.app_context():
+        assert [spot.id for spot in ParkingSpot.query.filter_by(lot_id=lot_id)] == [booked_id]
+        assert Reservation.query.one().spot_id == booked_id
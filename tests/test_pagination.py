@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.models import db, ParkingSpot, Reservation
+from backend.pagination import decode_cursor, encode_cursor
+
+
+def tampered(sort_value, row_id=1):
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def test_cursor_round_trips_its_sort_value():
+    booked_at = datetime(2025, 3, 4, 10, 30)
+    assert decode_cursor(encode_cursor(booked_at, 7)) == (booked_at, 7)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+
+@pytest.mark.parametrize('cursor', [tampered('yesterday'), tampered(12345), tampered(['2025-01-01']), 'not-base64!'])
+def test_tampered_cursor_is_a_bad_request(app, make_user, cursor):
+    _, headers = make_user()
+
+    response = app.test_client().get(f'/api/user/booking-history?cursor={cursor}', headers=headers)
+
+    assert response.status_code == 400
+
+
+def test_full_history_and_its_pages_share_one_order(app, make_lot, make_user):
+    lot_id = make_lot(spots=1)
+    user_id, headers = make_user()
+    start = datetime(2025, 1, 1, 9, 0)
+    with app.app_context():
+        spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).one().id
+        # Ties on booking time, and parking times that disagree with it.
+        for hours, parked in [(0, 5), (1, 1), (1, None), (2, 0), (3, 2)]:
+            db.session.add(Reservation(
+                user_id=user_id, user_name='driver', spot_id=spot_id, lot_id=lot_id, prime_location_name='central',
+                vehicle_number='TS09AB0001', booking_status='completed', booking_timestamp=start + timedelta(hours=hours),
+                parking_timestamp=start + timedelta(hours=parked) if parked is not None else None,
+                leaving_timestamp=start + timedelta(hours=6)))
+        db.session.commit()
+
+    client = app.test_client()
+    full = [item['id'] for item in client.get('/api/user/booking-history', headers=headers).get_json()['history']]
+
+    paged, cursor = [], ''
+    while cursor is not None:
+        body = client.get(f'/api/user/booking-history?limit=2&cursor={cursor}', headers=headers).get_json()
+        paged += [item['id'] for item in body['history']]
+        cursor = body['next_cursor']
+
+    assert full == paged and len(full) == 5
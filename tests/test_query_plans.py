@@ -0,0 +1,36 @@
+import pytest
+
+from backend.migrations import HOT_QUERIES, check_query_plans, query_plan
+from backend.models import db
+
+
+@pytest.mark.parametrize('index_name', sorted(HOT_QUERIES))
+def test_hot_query_uses_its_index(app, index_name):
+    with app.app_context():
+        plan = query_plan(HOT_QUERIES[index_name])
+
+    assert any(index_name in step for step in plan), f'{index_name}: {" / ".join(plan)}'
+
+
+def test_check_fails_once_an_index_is_gone(app):
+    with app.app_context():
+        db.session.execute(db.text('DROP INDEX ix_reservations_vehicle_open'))
+        db.session.commit()
+        # Pooled connections keep their prepared EXPLAIN statements.
+        db.engine.dispose()
+
+        with pytest.raises(AssertionError, match='ix_reservations_vehicle_open'):
+            check_query_plans()
+
+
+def test_init_db_command_restores_missing_indexes(app):
+    with app.app_context():
+        db.session.execute(db.text('DROP INDEX ix_reservations_vehicle_open'))
+        db.session.commit()
+        db.engine.dispose()
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        check_query_plans()
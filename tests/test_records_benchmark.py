@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from backend.models import db, ParkingSpot, Reservation, User
+from backend.queries import RESERVATION_ORDER, stream_admin_parking_records
+
+USERS = 10
+
+
+def per_row_records():
+    # The builder as it was before the joined projection: ORM rows plus a
+    # User and a ParkingSpot lookup per reservation.
+    records = []
+    for reservation in Reservation.query.order_by(*RESERVATION_ORDER):
+        user = db.session.get(User, reservation.user_id)
+        spot = db.session.get(ParkingSpot, reservation.spot_id)
+        duration_hours = None
+        if reservation.parking_timestamp and reservation.leaving_timestamp:
+            duration = reservation.leaving_timestamp - reservation.parking_timestamp
+            duration_hours = round(duration.total_seconds() / 3600, 2)
+
+        status_display = reservation.booking_status or 'completed'
+        if reservation.booking_status in ['cancelled', 'auto_cancelled']:
+            status_display = 'Cancelled'
+        elif reservation.leaving_timestamp:
+            status_display = 'Completed'
+        elif reservation.booking_status == 'occupied':
+            status_display = 'Active'
+        elif reservation.booking_status == 'booked':
+            status_display = 'Booked'
+
+        records.append({
+            'id': reservation.id,
+            'user_name': user.username if user else reservation.user_name or 'Unknown',
+            'prime_location_name': reservation.location_name or 'Unknown',
+            'spot_number': spot.spot_number if spot else 'Unknown',
+            'vehicle_number': reservation.vehicle_number or 'N/A',
+            'start_time': reservation.parking_timestamp.isoformat() if reservation.parking_timestamp else None,
+            'end_time': reservation.leaving_timestamp.isoformat() if reservation.leaving_timestamp else None,
+            'cost': float(reservation.parking_cost) if reservation.parking_cost else 0.0,
+            'duration_hours': duration_hours,
+            'booking_status': status_display,
+            'booking_timestamp': reservation.booking_timestamp.isoformat() if reservation.booking_timestamp else None,
+            'occupancy_timestamp': reservation.occupancy_timestamp.isoformat() if reservation.occupancy_timestamp else None
+        })
+    return records
+
+
+def measure(build):
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    db.session.expunge_all()
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        result = build()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return result, len(statements)
+
+
+@pytest.mark.parametrize('reservations', [40, 200, 1000])
+def test_joined_projection_takes_one_statement_at_any_size(app, make_lot, reservations):
+    lot_id = make_lot(spots=20)
+    start = datetime(2025, 1, 1)
+    with app.app_context():
+        db.session.execute(insert(User), [{
+            'username': f'driver{i}', 'phone_number': f'91{i:08d}', 'password_hash': 'x',
+        } for i in range(USERS)])
+        user_ids = [user.id for user in User.query.order_by(User.id)]
+        spot_ids = [spot.id for spot in ParkingSpot.query.filter_by(lot_id=lot_id)]
+        db.session.execute(insert(Reservation), [{
+            'user_id': user_ids[i % USERS], 'user_name': 'driver', 'spot_id': spot_ids[i % len(spot_ids)],
+            'lot_id': lot_id, 'prime_location_name': 'central', 'vehicle_number': f'KA01AB{i:04d}',
+            'booking_status': 'completed', 'booking_timestamp': start + timedelta(minutes=i),
+            'parking_timestamp': start + timedelta(minutes=i + 5), 'leaving_timestamp': start + timedelta(minutes=i + 95),
+            'parking_cost': 15.0,
+        } for i in range(reservations)])
+        db.session.commit()
+
+        before, before_statements = measure(per_row_records)
+        after, after_statements = measure(lambda: [row for batch in stream_admin_parking_records() for row in batch])
+
+    assert after == before
+    assert before_statements > reservations and after_statements == 1
@@ -0,0 +1,114 @@
+from collections import Counter
+
+import pytest
+
+from backend.cache_utils import CacheKeys
+from backend.models import db, ParkingSpot, Reservation
+from backend.spot_state import SpotCounts, allocate_spot, allocate_spots, lot_counts, lot_summary
+
+from test_booking_concurrency import run_together
+
+
+def test_stale_zero_counter_does_not_refuse_a_free_spot(app, redis_cache, make_lot):
+    lot_id = make_lot(spots=2)
+    with app.app_context():
+        redis_cache.delete(CacheKeys.free_spots(lot_id, 'non-EV'))
+        redis_cache.hset(CacheKeys.lot_counts(lot_id), SpotCounts.AVAILABLE, 0)
+
+        spot = allocate_spot(lot_id)
+        db.session.commit()
+
+        assert spot is not None and spot.status == 'B'
+
+
+def test_pool_is_reseeded_after_the_commit(app, redis_cache, make_lot):
+    lot_id = make_lot(spots=3)
+    pool = CacheKeys.free_spots(lot_id, 'non-EV')
+    with app.app_context():
+        redis_cache.delete(pool)
+
+        spot = allocate_spot(lot_id)
+        assert not redis_cache.exists(pool)
+        db.session.commit()
+
+        free = {int(spot_id) for spot_id in redis_cache.smembers(pool)}
+        assert spot.id not in free and len(free) == 2
+
+
+def test_spots_without_a_type_serve_default_bookings(app, make_lot):
+    # No Redis, so allocation reads the DB directly.
+    lot_id = make_lot(spots=3, vehicle_types={2: 'EV'})
+    with app.app_context():
+        ParkingSpot.query.filter_by(lot_id=lot_id, vehicle_type_supported='non-EV').update(
+            {'vehicle_type_supported': None})
+        db.session.commit()
+
+        assert allocate_spot(lot_id).vehicle_type_supported is None
+        assert allocate_spot(lot_id, 'EV').vehicle_type_supported == 'EV'
+        db.session.rollback()
+
+        spots = allocate_spots([None, 'non-EV'], lot_id=lot_id)
+        assert [spot.vehicle_type_supported for spot in spots] == [None, None]
+
+
+def test_every_free_spot_is_handed_out_under_contention(app, make_lot, make_user):
+    # No Redis, so every booking races for the lowest free spot in the DB.
+    lot_id = make_lot(spots=4)
+    users = [make_user() for _ in range(8)]
+
+    def book(headers, index):
+        return lambda: app.test_client().post(f'/api/user/parking-lots/{lot_id}/book', headers=headers, json={
+            'vehicle_number': f'MH12AB{index:04d}'}).status_code
+
+    statuses = Counter(run_together([book(headers, i) for i, (_, headers) in enumerate(users)]))
+
+    assert statuses == Counter({201: 4, 409: 4})
+    with app.app_context():
+        assert lot_summary([lot_id])[lot_id][SpotCounts.BOOKED] == 4
+        assert ParkingSpot.query.filter_by(lot_id=lot_id, status='A').count() == 0
+
+
+def test_contested_contiguous_batches_book_every_spot(app, redis_cache, make_lot, make_user):
+    lot_id = make_lot(spots=6)
+    users = [make_user() for _ in range(6)]
+
+    def book(headers, index):
+        return lambda: app.test_client().post('/api/user/book-batch', headers=headers, json={
+            'lot_id': lot_id, 'contiguous': True,
+            'vehicles': [f'TN07AB{index:02d}01', f'TN07AB{index:02d}02']}).status_code
+
+    statuses = Counter(run_together([book(headers, i) for i, (_, headers) in enumerate(users)]))
+
+    assert statuses == Counter({201: 3, 409: 3})
+    with app.app_context():
+        assert ParkingSpot.query.filter_by(lot_id=lot_id, status='B').count() == 6
+        assert Reservation.query.count() == 6
+        assert lot_counts([lot_id]) == lot_summary([lot_id])
+
+
+@pytest.mark.parametrize('payload', [
+    {'lot_id': 'central', 'vehicles': ['TN07AB0001']},
+    {'lot_id': True, 'vehicles': ['TN07AB0001']},
+    {'vehicles': [42]},
+    {'vehicles': [{'vehicle_number': ['TN07AB0001']}]},
+    {'vehicles': [{'vehicle_number': 'TN07AB0001', 'vehicle_type': 'truck'}]},
+])
+def test_batch_booking_rejects_malformed_input(app, make_lot, make_user, payload):
+    make_lot(spots=2)
+    _, headers = make_user()
+
+    response = app.test_client().post('/api/user/book-batch', headers=headers, json=payload)
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert Reservation.query.count() == 0
+
+
+def test_any_spot_booking_rejects_an_unknown_vehicle_type(app, make_lot, make_user):
+    lot_id = make_lot(spots=2)
+    _, headers = make_user()
+
+    response = app.test_client().post(f'/api/user/parking-lots/{lot_id}/book', headers=headers, json={
+        'vehicle_number': 'TN07AB0001', 'vehicle_type': 'truck'})
+
+    assert response.status_code == 400
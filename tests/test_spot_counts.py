@@ -0,0 +1,95 @@
+import threading
+
+from backend.cache_utils import CacheKeys
+from backend.models import db, ParkingSpot
+from backend import spot_state
+from backend.spot_state import (INSTALL_COUNTS_SCRIPT, SpotCounts, apply_deltas, lot_counts, lot_summary,
+                                rebuild_lot_counts, spot_map)
+
+
+def test_counts_follow_committed_writes(app, redis_cache, make_lot):
+    lot_id = make_lot(spots=3)
+    with app.app_context():
+        assert lot_counts([lot_id])[lot_id][SpotCounts.AVAILABLE] == 3
+
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id).first()
+        spot.status = 'B'
+        db.session.commit()
+
+        counts = lot_counts([lot_id])[lot_id]
+        assert (counts[SpotCounts.AVAILABLE], counts[SpotCounts.BOOKED]) == (2, 1)
+
+
+def test_delta_from_an_older_build_drops_the_hash(app, redis_cache, make_lot):
+    lot_id = make_lot(spots=3)
+    with app.app_context():
+        rebuild_lot_counts([lot_id])
+        apply_deltas({(lot_id, SpotCounts.AVAILABLE): -1}, {lot_id: 'stale'})
+
+        assert not redis_cache.exists(CacheKeys.lot_counts(lot_id))
+        assert lot_counts([lot_id])[lot_id][SpotCounts.AVAILABLE] == 3
+
+
+def test_delta_during_a_rebuild_cancels_the_install(app, redis_cache, make_lot):
+    lot_id = make_lot(spots=3)
+    keys = [CacheKeys.lot_counts(lot_id), CacheKeys.lot_counts_generation(lot_id),
+            CacheKeys.lot_counts_building(lot_id)]
+    with app.app_context():
+        redis_cache.set(keys[2], 'token')
+        apply_deltas({(lot_id, SpotCounts.AVAILABLE): -1}, {lot_id: ''})
+
+        install = redis_cache.register_script(INSTALL_COUNTS_SCRIPT)
+        assert install(keys=keys, args=['token', 60, SpotCounts.AVAILABLE, 3]) == 0
+        assert not redis_cache.exists(keys[0])
+
+
+def test_counts_match_the_db_after_concurrent_bookings_and_rebuilds(app, redis_cache, make_lot, make_user):
+    lot_id = make_lot(spots=6)
+    users = [make_user() for _ in range(12)]
+    start = threading.Barrier(len(users) + 1)
+
+    def book(headers, index):
+        start.wait()
+        app.test_client().post(f'/api/user/parking-lots/{lot_id}/book', json={'vehicle_number': f'TS09AB{index:04d}'},
+                               headers=headers)
+
+    def rebuild():
+        start.wait()
+        for _ in range(5):
+            with app.app_context():
+                rebuild_lot_counts([lot_id])
+
+    threads = [threading.Thread(target=book, args=(headers, i)) for i, (_, headers) in enumerate(users)]
+    threads.append(threading.Thread(target=rebuild))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        assert lot_counts([lot_id]) == lot_summary([lot_id])
+        assert lot_summary([lot_id])[lot_id][SpotCounts.BOOKED] == 6
+
+
+def test_spot_map_build_does_not_overwrite_a_newer_bit(app, redis_cache, make_lot, monkeypatch):
+    lot_id = make_lot(spots=3)
+    build = spot_state.build_spot_map
+
+    def build_then_book(lot_id):
+        built = build(lot_id)
+        # A booking commits after the build read the DB, before it stores.
+        with app.app_context():
+            spot = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id).first()
+            spot.status = 'B'
+            db.session.commit()
+        return built
+
+    with app.app_context():
+        monkeypatch.setattr(spot_state, 'build_spot_map', build_then_book)
+        assert spot_map(lot_id)['counts'][SpotCounts.AVAILABLE] == 3
+        monkeypatch.setattr(spot_state, 'build_spot_map', build)
+
+        counts = spot_map(lot_id)['counts']
+        assert (counts[SpotCounts.AVAILABLE], counts[SpotCounts.BOOKED]) == (2, 1)
+        assert spot_map(lot_id)['counts'] == counts  # stored this time
+        assert redis_cache.exists(CacheKeys.spot_map(lot_id, 'layout'))
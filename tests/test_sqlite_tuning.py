@@ -0,0 +1,96 @@
+from collections import Counter
+
+from flask import Flask
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+
+from backend.models import db
+from backend.sqlite_tuning import is_tuned, run_maintenance, sqlite_pragmas
+from test_booking_concurrency import run_together
+
+
+def pragma(name):
+    with db.engine.connect() as connection:
+        return connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+
+def test_new_connections_get_the_tuning_pragmas(app):
+    with app.app_context():
+        db.engine.dispose()
+
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('busy_timeout') == 5000
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('temp_store') == 2  # MEMORY
+        assert pragma('cache_size') == -64 * 1024
+        assert pragma('mmap_size') == 256 * 1024 * 1024
+
+
+def test_pragmas_follow_the_config():
+    pragmas = dict(sqlite_pragmas({'SQLITE_BUSY_TIMEOUT_MS': 250, 'SQLITE_CACHE_SIZE_KB': 1024}))
+    assert pragmas['busy_timeout'] == 250 and pragmas['cache_size'] == -1024
+
+
+def test_tuning_only_applies_to_sqlite_when_enabled():
+    app = Flask(__name__)
+    app.config.update(SQLITE_TUNING=True, SQLALCHEMY_DATABASE_URI='postgresql://localhost/parking')
+    assert not is_tuned(app)
+    app.config.update(SQLITE_TUNING=False, SQLALCHEMY_DATABASE_URI='sqlite:///parking.db')
+    assert not is_tuned(app)
+
+
+def test_maintenance_checkpoints_the_wal(app, make_lot):
+    make_lot(spots=10)
+    with app.app_context():
+        result = run_maintenance(db, optimize=True)
+
+    assert not result['busy'] and result['checkpointed'] == result['log_frames']
+
+
+def run_mixed_load(path, pragmas, readers=4, writers=2, ops=150):
+    # SQLite's own defaults: rollback journal and no busy timeout.
+    engine = create_engine(f'sqlite:///{path}', connect_args={'timeout': 0, 'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        for name, value in pragmas:
+            dbapi_connection.execute(f'PRAGMA {name}={value}')
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE spot (id INTEGER PRIMARY KEY, status TEXT)')
+        connection.exec_driver_sql("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200) "
+                                   "INSERT INTO spot (status) SELECT 'A' FROM n")
+
+    done, busy = Counter(), Counter()
+
+    def read():
+        for _ in range(ops):
+            try:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql('SELECT status, COUNT(*) FROM spot GROUP BY status').all()
+                done['read'] += 1
+            except OperationalError:
+                busy['read'] += 1
+
+    def write(offset):
+        for i in range(ops):
+            try:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql('UPDATE spot SET status = ? WHERE id = ?',
+                                               ('B' if i % 2 else 'A', (offset + i) % 200 + 1))
+                done['write'] += 1
+            except OperationalError:
+                busy['write'] += 1
+
+    run_together([read] * readers + [lambda offset=offset: write(offset) for offset in range(writers)])
+    engine.dispose()
+    return done, busy
+
+
+def test_tuned_sqlite_survives_mixed_load_without_busy_errors(tmp_path):
+    done, busy = run_mixed_load(tmp_path / 'tuned.db', sqlite_pragmas({}))
+    default_done, default_busy = run_mixed_load(tmp_path / 'default.db', [])
+
+    assert sum(busy.values()) == 0 and done == Counter(read=4 * 150, write=2 * 150)
+    assert sum(default_busy.values()) > 0
+    assert sum(done.values()) > sum(default_done.values())